@@ -7,11 +7,43 @@ It uses various methods to determine the optimal next move, including searching
 generating placement counts for potential ship positions.
 
 Classes:
+    - `EndgameSolver`: Enumerates every consistent layout late in a game and chooses the shot
+                that minimises the expected number of shots to finish. This is only exact
+                when the layouts leave at most max_worlds (16) distinct sets of unhit cells,
+                otherwise it shoots the cell in the most layouts.
     - `mainAI`: Represents the AI opponent with methods for generating attacks, 
                 registering hits and misses, 
                 and determining the next move.
+    - `MoveCache`: A bounded least recently used cache of search moves keyed on the game
+                state, which can be shared by every AI in a process as `shared_move_cache`.
+    - `PosteriorSampler`: Draws complete fleet layouts consistent with the hits, misses
+                and remaining ships, to estimate the chance of each cell holding a ship.
+    - `TargetQueue`: A first in first out queue of cells to attack that holds each cell once.
+    - `DensityMap`: Keeps the placement counts of one ship length up to date as shots
+                are registered, so each shot only removes the placements it rules out.
 
 Functions:
+    - `consistent_placements(size: int, fleet: dict, remaining: dict, hits: int,
+                             misses: int) -> list[tuple[int]]`:
+        Finds the placements each ship could be in given the hits and misses.
+
+    - `search_index(size: int, ship_length: int) -> tuple`:
+        Returns the cached placements the AI searches over for a ship length, with the mask
+        of cells that rule each placement out.
+
+    - `search_cell_index(size: int, ship_length: int) -> tuple`:
+        Returns the cached cell numbers of each placement and the placements each cell rules out.
+
+    - `search_order(size: int) -> tuple`:
+        Returns the cached order cells are compared in, so ties are broken consistently.
+
+    - `parity_cells(size: int, smallest: int) -> tuple`:
+        Returns the cached lattice of cells every ship at least `smallest` long must cover.
+
+    - `numpy_placement_count(shot_grid: np.ndarray, ship_length: int) -> np.ndarray`:
+        Counts the placements covering each cell with vectorized sliding window sums,
+        used by the optional 'numpy' backend of mainAI.
+
     - `check_if_in_bounds(x: int, y: int, length: int, orientation: str) -> bool`: 
         Checks if placing a ship at a given position and orientation is within 
         the bounds of the game board.
@@ -20,25 +52,68 @@ Functions:
         Creates a placement count dictionary for a given ship length, indicating 
         potential ship positions on the board.
 
+    - `density(ship_length: int) -> DensityMap`:
+        Returns the persistent DensityMap for a ship length.
+
     - `add_NSEW_to_queue(coord: tuple[int, int]) -> None`: 
         Adds the North, South, East, and West coordinates of
         a hit to the queue for further exploration.
 
-    - `generate_hit_search() -> tuple[int, int]`: 
-        Generates a search coordinate based on the placement counts of ships.
+    - `__getstate__() -> dict` and `__setstate__(state: dict) -> None`:
+        Pickle the AI without its move cache, which a loaded AI shares with the process
+        as `shared_move_cache`, so its state can be kept outside the process. Its DensityMaps
+        are pickled with their counts, without their shared index tables.
+
+    - `is_shot(coord: tuple[int, int]) -> bool`:
+        Checks the shot bitset for whether a cell has been hit or missed.
+
+    - `generate_hit_search(deadline: float = None) -> tuple[int, int]`: 
+        Generates a search coordinate based on the placement counts of ships,
+        refined until the deadline if one is given.
+
+    - `state_key(refined: bool) -> tuple`:
+        Returns a hashable encoding of the state the search move depends on.
+
+    - `search(deadline: float = None) -> tuple[int, int]`:
+        Does the search for generate_hit_search without using the move cache.
+
+    - `hunt_cells() -> tuple`:
+        Returns the cells scored when hunting, the parity lattice of the smallest ship left.
+
+    - `best_cell(score: callable, cells: tuple) -> int`:
+        Returns the unshot cell with the highest score.
+
+    - `refine_search(best_coord: tuple[int, int], deadline: float) -> tuple[int, int]`:
+        Improves on a search coordinate by sampling consistent fleet layouts until the deadline.
+
+    - `new_next_move(ships: dict[str, int], refine: bool = True) -> tuple[int, int]`: 
+        Determines the next move, either following up the hits of ships that are not sunk
+        or using the optimal search coordinate found within time_allowed seconds, or from
+        the placement counts alone if refine is False.
 
-    - `new_next_move(ships: dict[str, int]) -> tuple[int, int]`: 
-        Determines the next move, either from the end of the queue 
-        or using the optimal search coordinate.
+    - `target_move() -> tuple[int, int]`:
+        Chooses a move along a line of hits, or next to a hit, of a ship that is not sunk.
+
+    - `next_to_live_hit(coord: tuple[int, int]) -> bool`:
+        Checks if a cell is next to a hit that is not part of a sunk ship.
+
+    - `update_sunk_ships(ships: dict[str, int]) -> None`:
+        Works out the cells of a ship the last shot sank and stops following them up.
+
+    - `sunk_ship_cells(coord: tuple[int, int], ship_length: int) -> list[tuple[int, int]]`:
+        Finds the line of hits a sunk ship was on.
 
     - `add_hit(coord: tuple[int, int]) -> None`: 
-        Adds a hit coordinate to the list of hits and updates the queue with NSEW coordinates.
+        Adds a hit coordinate to the set of hits and updates the queue with NSEW coordinates.
 
     - `add_miss(coord: tuple[int, int]) -> None`: 
-        Adds a miss coordinate to the list of misses.
+        Adds a miss coordinate to the set of misses.
+
+    - `record_shot(coord: tuple[int, int]) -> None`:
+        Marks a cell as shot and updates every DensityMap.
 
     - `register_shot(coord: tuple[int, int], hit: bool) -> None`: 
-        Registers a shot, updating the hits and misses lists based on the result.
+        Registers a shot, updating the hits and misses sets based on the result.
 
     - `check_if_offset_in_list(x: int, y: int, ship_length: int, 
                                 orientation: str, data: list) -> bool`: 
@@ -50,6 +125,11 @@ Usage:
         ai_opponent = mainAI(size=10, time_allowed=5)
         ```
 
+    - To count placements with numpy, which is much faster on boards larger than 10x10:
+        ```
+        ai_opponent = mainAI(size=20, backend='numpy')
+        ```
+
     - To generate the next move based on the current ship configuration:
         ```
         next_move = ai_opponent.new_next_move(ships={'ship1': 3, 'ship2': 2})
@@ -67,38 +147,680 @@ Usage:
 """
 
 
+import random
+import threading
 import time
-from components import create_battleships
+from collections import OrderedDict, deque
+from functools import lru_cache
+
+try:
+    import numpy as np
+except ImportError: # numpy is only needed for the 'numpy' backend
+    np = None
+
+from bitboard import cell_bit, placement_index
+from components import QUICK_PICKS, create_battleships
+
+# how many layouts are sampled between checks of the move deadline
+REFINE_BATCH = 16
+
+
+@lru_cache(maxsize=None)
+def search_index(size:int,ship_length:int)->tuple:
+    '''
+    returns the placements the AI searches over for a ship length, built once and cached
+    each entry is the mask of cells that rule the placement out if they have been shot at
+    (the cells of the ship and the cell after its end, matching check_if_offset_in_list)
+    and the coordinates of the cells of the ship
+    Args:
+        size (int): the size of the board
+        ship_length (int): the length of the ship
+    Returns:
+        tuple[tuple[int,tuple]]: the (blocking mask, cells) of each placement
+    '''
+    index = []
+    for placement in placement_index(size,ship_length):
+        blocking = placement.mask
+        if placement.orientation == 'horizontal' and placement.x+ship_length < size:
+            blocking |= cell_bit(placement.x+ship_length,placement.y,size)
+        elif placement.orientation == 'vertical' and placement.y+ship_length < size:
+            blocking |= cell_bit(placement.x,placement.y+ship_length,size)
+        index.append((blocking,placement.cells))
+    return tuple(index)
+
+
+@lru_cache(maxsize=None)
+def search_cell_index(size:int,ship_length:int)->tuple:
+    '''
+    returns the lookups a DensityMap needs to update its counts after a shot, built once and cached
+    Args:
+        size (int): the size of the board
+        ship_length (int): the length of the ship
+    Returns:
+        tuple[tuple,tuple]: the cell numbers (y*size+x) of each placement in search_index,
+        and for each cell number the ids of the placements that cell rules out
+    '''
+    index = search_index(size,ship_length)
+    placement_cells = tuple(tuple(y*size+x for x,y in cells) for _,cells in index)
+    ruled_out_by = [[] for _ in range(size*size)]
+    for placement_id,(blocking,_) in enumerate(index):
+        while blocking:
+            lowest = blocking & -blocking
+            ruled_out_by[lowest.bit_length()-1].append(placement_id)
+            blocking ^= lowest
+    return placement_cells,tuple(tuple(ids) for ids in ruled_out_by)
+
+
+@lru_cache(maxsize=None)
+def search_order(size:int)->tuple:
+    '''
+    returns the cell numbers (y*size+x) in the order create_placement_count lists its coordinates,
+    so ties between equal counts are broken the same way
+    Args:
+        size (int): the size of the board
+    Returns:
+        tuple[int]: the cell numbers, going down each column in turn
+    '''
+    return tuple(y*size+x for x in range(size) for y in range(size))
+
+
+def numpy_placement_count(shot_grid,ship_length:int):
+    '''
+    counts the placements of a ship length covering each cell with numpy, giving the same counts
+    as create_placement_count, using sliding window sums over the grid of shot cells
+    Args:
+        shot_grid (np.ndarray): a (size, size) boolean array indexed [y, x], True where a cell
+        has been hit or missed
+        ship_length (int): the length of the ship
+    Returns:
+        np.ndarray: a (size, size) integer array indexed [y, x] of the counts
+    '''
+    size = shot_grid.shape[0]
+    counts = np.zeros((size,size),dtype=np.int64)
+    starts = size-ship_length+1
+    if ship_length <= 0 or starts <= 0:
+        return counts
+    for grid,out in ((shot_grid,counts),(shot_grid.T,counts.T)):
+        # a placement is ruled out by a shot on the ship or on the cell after its end,
+        # so pad a column of unshot cells past the edge and sum windows of ship_length+1 cells
+        padded = np.zeros((size,size+2),dtype=np.int64)
+        padded[:,1:size+1] = grid
+        cumulative = np.cumsum(padded,axis=1)
+        windows = cumulative[:,ship_length+1:ship_length+1+starts] - cumulative[:,:starts]
+        valid = (windows == 0).astype(np.int64)
+        # each valid start adds 1 to the ship_length cells from the start onwards
+        for i in range(ship_length):
+            out[:,i:i+starts] += valid
+    return counts
+
+
+@lru_cache(maxsize=None)
+def parity_cells(size:int,smallest:int)->tuple:
+    '''
+    returns the cells where (x+y) is a multiple of the length of the smallest ship left,
+    every ship covers at least one of them, so they are the only cells worth hunting
+    Args:
+        size (int): the size of the board
+        smallest (int): the length of the smallest ship left
+    Returns:
+        tuple[int]: the cell numbers (y*size+x), in the order of search_order
+    '''
+    return tuple(cell for cell in search_order(size)
+                 if (cell % size + cell // size) % smallest == 0)
+
+
+class DensityMap:
+    '''
+    this class keeps the placement counts of one ship length up to date as shots are registered,
+    so a shot only removes the placements it rules out instead of recounting the board
+    '''
+
+    def __init__(self,size:int,ship_length:int,shot:int = 0):
+        '''
+        this function counts the placements that are not ruled out by the shots so far
+        Args:
+            size (int): the size of the board
+            ship_length (int): the length of the ship
+            shot (int): the mask of cells that have been hit or missed (default 0)
+        '''
+        self.size = size
+        self.ship_length = ship_length
+        self.counts = [0]*(size*size)
+        self.placement_cells,self.ruled_out_by = search_cell_index(size,ship_length)
+        self.alive = bytearray(len(self.placement_cells))
+        for placement_id,(blocking,_) in enumerate(search_index(size,ship_length)):
+            if blocking & shot == 0:
+                self.alive[placement_id] = 1
+                for cell in self.placement_cells[placement_id]:
+                    self.counts[cell] += 1
+
+    def __getstate__(self)->dict:
+        '''returns the state of the map to pickle, the counts and the placements still alive,
+        leaving out the index tables which are shared by every map of the same length
+        Returns:
+            dict: the attributes of the map'''
+        state = self.__dict__.copy()
+        del state['placement_cells'],state['ruled_out_by']
+        return state
+
+    def __setstate__(self,state:dict):
+        '''restores a pickled map, taking the index tables from the cache of this process
+        Args:
+            state (dict): the attributes of the map'''
+        self.__dict__.update(state)
+        self.placement_cells,self.ruled_out_by = search_cell_index(self.size,self.ship_length)
+
+    def register_shot(self,coord:tuple[int,int]):
+        '''removes the placements a shot rules out from the counts
+        Args:
+            coord (tuple[int,int]): the coordinates of the shot'''
+        x,y = coord
+        for placement_id in self.ruled_out_by[y*self.size+x]:
+            if self.alive[placement_id]:
+                self.alive[placement_id] = 0
+                for cell in self.placement_cells[placement_id]:
+                    self.counts[cell] -= 1
+
+
+class TargetQueue:
+    '''
+    this class is a first in first out queue of cells to attack, which ignores a cell that is
+    already in it, so each cell is queued at most once
+    '''
+
+    def __init__(self):
+        '''
+        this function initialises an empty queue
+        '''
+        self._cells = deque()
+        self._queued = set()
+
+    def __len__(self)->int:
+        '''the number of cells in the queue'''
+        return len(self._cells)
+
+    def __contains__(self,coord:tuple[int,int])->bool:
+        '''True if the cell is in the queue'''
+        return coord in self._queued
+
+    def __iter__(self):
+        '''iterates over the cells from the front of the queue'''
+        return iter(self._cells)
+
+    def append(self,coord:tuple[int,int])->bool:
+        '''adds a cell to the back of the queue, unless it is already in it
+        Args:
+            coord (tuple[int,int]): the coordinates of the cell
+        Returns:
+            bool: True if the cell was added, False if it was already queued'''
+        if coord in self._queued:
+            return False
+        self._queued.add(coord)
+        self._cells.append(coord)
+        return True
+
+    def popleft(self)->tuple[int,int]:
+        '''removes and returns the cell at the front of the queue
+        Returns:
+            tuple[int,int]: the coordinates of the cell'''
+        coord = self._cells.popleft()
+        self._queued.discard(coord)
+        return coord
+
+    def clear(self)->None:
+        '''removes every cell from the queue'''
+        self._cells.clear()
+        self._queued.clear()
+
+
+class MoveCache:
+    '''
+    this class is a bounded least recently used cache of search moves, keyed on a hashable
+    encoding of the game state, so a state that has been searched before costs a dictionary
+    lookup instead of a new search
+    one cache can be shared by every AI in a process, like shared_move_cache
+    '''
+
+    def __init__(self,maxsize:int = 10000):
+        '''
+        this function initialises an empty cache
+        Args:
+            maxsize (int): the most moves kept, the least recently used being dropped
+            first (default 10000)
+        '''
+        self.maxsize = maxsize
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._moves = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self)->int:
+        '''the number of moves in the cache'''
+        return len(self._moves)
+
+    def get(self,key:tuple)->tuple[int,int]:
+        '''returns the move cached for a state, counting the lookup as a hit or a miss
+        Args:
+            key (tuple): the encoding of the state, from mainAI.state_key
+        Returns:
+            tuple[int,int]: the cached move, or None if the state is not cached
+        '''
+        with self._lock:
+            move = self._moves.get(key)
+            if move is None:
+                self.cache_misses += 1
+                return None
+            self._moves.move_to_end(key)
+            self.cache_hits += 1
+            return move
+
+    def put(self,key:tuple,move:tuple[int,int])->None:
+        '''caches the move for a state, dropping the least recently used move if it is full
+        Args:
+            key (tuple): the encoding of the state, from mainAI.state_key
+            move (tuple[int,int]): the move for that state
+        '''
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._moves[key] = move
+            self._moves.move_to_end(key)
+            while len(self._moves) > self.maxsize:
+                self._moves.popitem(last=False)
+
+    def clear(self)->None:
+        '''removes every move and resets the counters'''
+        with self._lock:
+            self._moves.clear()
+            self.cache_hits = 0
+            self.cache_misses = 0
+
+
+shared_move_cache = MoveCache()
+
+
+def consistent_placements(size:int,fleet:dict[str,int],remaining:dict[str,int],hits:int,
+                          misses:int)->list[tuple[int]]:
+    '''
+    finds the placements each ship could be in on its own, which avoid the misses and cover
+    exactly as many hits as the ship has lost cells
+    Args:
+        size (int): the size of the board
+        fleet (dict): the full length of each ship
+        remaining (dict): the number of cells of each ship that have not been hit
+        hits (int): the mask of cells that have been hit
+        misses (int): the mask of cells that have been missed
+    Returns:
+        list[tuple[int]]: the placement masks of each ship, the ships with the fewest first
+    '''
+    candidates = []
+    for name,left in remaining.items():
+        ship_length = max(fleet.get(name,left),left)
+        if ship_length <= 0:
+            continue
+        hits_needed = ship_length-left
+        candidates.append(tuple(
+            placement.mask for placement in placement_index(size,ship_length)
+            if placement.mask & misses == 0
+            and (placement.mask & hits).bit_count() == hits_needed))
+    # placing the most constrained ships first rejects fewer layouts
+    candidates.sort(key=len)
+    return candidates
+
+
+class PosteriorSampler:
+    '''
+    this class draws complete fleet layouts that are consistent with every hit, miss and the
+    ships remaining, and counts how often each cell holds a ship in them
+    each ship must avoid the misses, cover exactly as many hits as it has lost cells
+    and not overlap the other ships, and the fleet must cover every hit
+    '''
+
+    def __init__(self,size:int,fleet:dict[str,int],remaining:dict[str,int],hits:int,misses:int,
+                 seed:int = None):
+        '''
+        this function finds the placements each ship could still be in
+        Args:
+            size (int): the size of the board
+            fleet (dict): the full length of each ship
+            remaining (dict): the number of cells of each ship that have not been hit
+            hits (int): the mask of cells that have been hit
+            misses (int): the mask of cells that have been missed
+            seed (int): the seed for the random number generator (default None)
+        '''
+        self.size = size
+        self.hits = hits
+        self.rng = random.Random(seed)
+        self.candidates = consistent_placements(size,fleet,remaining,hits,misses)
+
+    def sample(self)->list[int]:
+        '''draws one layout, placing each ship in turn at a random placement that does not
+        overlap the ships already placed
+        Returns:
+            list[int]: the mask of each ship, or None if the layout could not be completed
+            or does not cover every hit
+        '''
+        taken = 0
+        layout = []
+        for candidates in self.candidates:
+            if not candidates:
+                return None
+            for _ in range(QUICK_PICKS):
+                mask = candidates[self.rng.randrange(len(candidates))]
+                if mask & taken == 0:
+                    break
+            else:
+                legal = [mask for mask in candidates if mask & taken == 0]
+                if not legal:
+                    return None
+                mask = self.rng.choice(legal)
+            taken |= mask
+            layout.append(mask)
+        if taken & self.hits != self.hits:
+            return None
+        return layout
+
+    def tally(self,samples:int,deadline:float = None)->tuple[list[int],int]:
+        '''draws layouts and counts how many of them have a ship on each cell
+        Args:
+            samples (int): the number of layouts to draw
+            deadline (float): the time.time() to stop drawing at, or None for no limit
+        Returns:
+            tuple[list[int],int]: the count for each cell number (y*size+x),
+            and the number of layouts that were consistent
+        '''
+        masks = {}
+        drawn = 0
+        accepted = 0
+        while drawn < samples and (deadline is None or time.time() < deadline):
+            for _ in range(min(REFINE_BATCH,samples-drawn)):
+                layout = self.sample()
+                if layout is None:
+                    continue
+                accepted += 1
+                for mask in layout:
+                    masks[mask] = masks.get(mask,0)+1
+            drawn += REFINE_BATCH
+        cell_counts = [0]*(self.size*self.size)
+        for mask,count in masks.items():
+            while mask:
+                lowest = mask & -mask
+                cell_counts[lowest.bit_length()-1] += count
+                mask ^= lowest
+        return cell_counts,accepted
+
+    def cell_probabilities(self,samples:int,deadline:float = None)->list[float]:
+        '''the chance of each cell holding a ship, estimated from the sampled layouts
+        Args:
+            samples (int): the number of layouts to draw
+            deadline (float): the time.time() to stop drawing at, or None for no limit
+        Returns:
+            list[float]: the probability for each cell number (y*size+x), all 0 if no
+            consistent layout was found
+        '''
+        cell_counts,accepted = self.tally(samples,deadline)
+        if accepted == 0:
+            return [0.0]*len(cell_counts)
+        return [count/accepted for count in cell_counts]
 
 
+class OutOfTime(Exception):
+    '''raised inside the EndgameSolver when its deadline passes'''
+
+
+class EndgameSolver:
+    '''
+    this class solves the end of a game exactly, by enumerating every layout of the ships left
+    consistent with the hits and misses, and choosing the shot that minimises the expected
+    number of shots needed to hit every ship cell that is left, the minimum is only searched
+    for when there are at most max_worlds distinct sets of unhit cells, as the search grows
+    exponentially with them, past that or the deadline it shoots the cell in the most layouts,
+    which is what most endgames with several ships left get
+    '''
+
+    def __init__(self,size:int,fleet:dict[str,int],remaining:dict[str,int],hits:int,misses:int,
+                 deadline:float = None,max_layouts:int = 100000,max_worlds:int = 16):
+        '''
+        this function finds the placements each ship could still be in
+        Args:
+            size (int): the size of the board
+            fleet (dict): the full length of each ship
+            remaining (dict): the number of cells of each ship left that have not been hit
+            hits (int): the mask of hits the ships left must cover
+            misses (int): the mask of cells none of the ships left can be on, the misses
+            and the cells of sunk ships
+            deadline (float): the time.time() to give up at, or None for no limit
+            max_layouts (int): the most layouts enumerated before giving up (default 100000)
+            max_worlds (int): the most distinct sets of unhit ship cells the expected number
+            of shots is minimised over, past which the most likely cell is chosen (default 16)
+        '''
+        self.size = size
+        self.hits = hits
+        self.deadline = deadline
+        self.max_layouts = max_layouts
+        self.max_worlds = max_worlds
+        self.candidates = consistent_placements(size,fleet,remaining,hits,misses)
+        # reach[i] is every cell the ships from i onwards could cover, so a partial layout
+        # that leaves a hit outside it can be pruned
+        self.reach = [0]*(len(self.candidates)+1)
+        for i in range(len(self.candidates)-1,-1,-1):
+            covered = self.reach[i+1]
+            for mask in self.candidates[i]:
+                covered |= mask
+            self.reach[i] = covered
+        self.steps = 0
+        self.memo = {}
+
+    def check_deadline(self,every:int = 1):
+        '''raises OutOfTime once the deadline has passed
+        Args:
+            every (int): only check on every this many calls, for the cheapest steps (default 1)'''
+        self.steps += 1
+        if self.steps % every == 0 and self.deadline is not None and time.time() >= self.deadline:
+            raise OutOfTime()
+
+    def worlds(self)->dict[int,int]:
+        '''
+        enumerates every consistent layout with a depth first search
+        Returns:
+            dict[int,int]: the number of layouts for each mask of unhit ship cells,
+            or None if there are more layouts than max_layouts
+        '''
+        worlds = {}
+        layouts = 0
+        stack = [(0,0)]
+        while stack:
+            self.check_deadline(every=256)
+            depth,taken = stack.pop()
+            if depth == len(self.candidates):
+                if taken & self.hits == self.hits:
+                    world = taken & ~self.hits
+                    worlds[world] = worlds.get(world,0)+1
+                    layouts += 1
+                    if layouts > self.max_layouts:
+                        return None
+                continue
+            if self.hits & ~taken & ~self.reach[depth]:
+                continue # a hit can no longer be covered
+            for mask in self.candidates[depth]:
+                if mask & taken == 0:
+                    stack.append((depth+1,taken | mask))
+        return worlds
+
+    def expected_shots(self,worlds:dict[int,int])->tuple[float,int]:
+        '''
+        finds the shot that minimises the expected number of shots to hit every cell left
+        Args:
+            worlds (dict): the weight of each mask of unhit ship cells
+        Returns:
+            tuple[float,int]: the expected number of shots, and the cell number to shoot
+        '''
+        union = 0
+        common = -1
+        total = 0
+        for world,weight in worlds.items():
+            union |= world
+            common &= world
+            total += weight
+        if union == 0:
+            return 0.0,None
+        if common:
+            # a cell in every world is a certain hit that tells us nothing, so shooting it now
+            # costs the same as shooting it later
+            lowest = common & -common
+            left = {world & ~common:weight for world,weight in worlds.items()}
+            expected,_ = self.expected_shots(left)
+            return common.bit_count()+expected,lowest.bit_length()-1
+        key = frozenset(worlds.items())
+        if key in self.memo:
+            return self.memo[key]
+        self.check_deadline()
+        best = (float('inf'),None)
+        for cell in search_order(self.size):
+            bit = 1 << cell
+            if not union & bit:
+                continue
+            hit = {}
+            miss = {}
+            hit_weight = 0
+            for world,weight in worlds.items():
+                if world & bit:
+                    hit[world & ~bit] = hit.get(world & ~bit,0)+weight
+                    hit_weight += weight
+                else:
+                    miss[world] = weight
+            expected = 1.0 + hit_weight/total*self.expected_shots(hit)[0]
+            if miss:
+                expected += (total-hit_weight)/total*self.expected_shots(miss)[0]
+            if expected < best[0]-1e-9:
+                best = (expected,cell)
+        self.memo[key] = best
+        return best
+
+    def solve(self)->tuple[int,int]:
+        '''
+        chooses the shot that minimises the expected number of shots to finish the game,
+        or the most likely cell when there are too many worlds to minimise over in time
+        Returns:
+            tuple[int,int]: the coordinates of the attack, or None if the deadline passed
+            or there were too many layouts
+        '''
+        try:
+            worlds = self.worlds()
+            if not worlds:
+                return None
+            if len(worlds) <= self.max_worlds:
+                try:
+                    cell = self.expected_shots(worlds)[1]
+                except OutOfTime:
+                    cell = None
+                if cell is not None:
+                    return (cell % self.size,cell // self.size)
+        except OutOfTime:
+            return None
+        cell_weights = [0]*(self.size*self.size)
+        for world,weight in worlds.items():
+            while world:
+                lowest = world & -world
+                cell_weights[lowest.bit_length()-1] += weight
+                world ^= lowest
+        cell = max(search_order(self.size),key=cell_weights.__getitem__)
+        return (cell % self.size,cell // self.size)
+
 
 class mainAI:
     '''
     this class represents the main AI opponent for the battleships game
     '''
 
-    def __init__(self,size:int,time_allowed:int=5,hits:list[tuple[int,int]] = None,
-                 misses:list[tuple[int,int]] = None):
+    def __init__(self,size:int,time_allowed:int=5,hits:set[tuple[int,int]] = None,
+                 misses:set[tuple[int,int]] = None,backend:str = 'python',
+                 samples:int = 2000,seed:int = None,move_cache:MoveCache = None,
+                 opening_book = None,endgame_threshold:int = 6):
         '''
         this function initialises the AI
         Args:
             size (int): the size of the board
             time_allowed (int): the time allowed for the AI to make a move
-            hits (list): the list of hits
-            misses (list): the list of misses
+            hits (set): the coordinates hit so far, any iterable of coordinates can be given
+            misses (set): the coordinates missed so far, any iterable of coordinates can be given
+            backend (str): how placements are counted, 'python' keeps a DensityMap for each
+            ship length, 'numpy' recounts with vectorized numpy operations (default 'python')
+            samples (int): the most fleet layouts sampled to refine each search move (default 2000)
+            seed (int): the seed for the random number generator used to sample (default None)
+            move_cache (MoveCache): the cache of search moves, such as shared_move_cache to share
+            it with the other AIs in the process (default None, a cache of this AI's own)
+            opening_book (OpeningBook): precomputed first moves from the opening_book module,
+            played until the game leaves the book (default None)
+            endgame_threshold (int): the number of unhit ship cells left at or below which
+            moves are chosen by the EndgameSolver, which is exact when the layouts left give
+            at most 16 distinct sets of unhit cells and shoots the cell in the most layouts
+            otherwise (default 6)
+        Raises:
+            ValueError: if the backend is not 'python' or 'numpy', or numpy is not installed
         '''
+        if backend not in ('python','numpy'):
+            raise ValueError('backend must be "python" or "numpy"')
+        if backend == 'numpy' and np is None:
+            raise ValueError('the numpy backend needs numpy to be installed')
+        self.backend = backend
         self.size = size
         if hits is None:
             hits = []
-        self.hits = hits
+        self.hits = set(hits)
 
         if misses is None:
             misses = []
-        self.misses = misses
+        self.misses = set(misses)
         self.ships = create_battleships()
+        # the full length of each ship, as self.ships only holds what is left of them
+        self.fleet = dict(self.ships)
         self.start = time.time()
         self.time_allowed = time_allowed
-        self.queue =[]
+        self.samples = samples
+        self.rng = random.Random(seed)
+        self.queue = TargetQueue()
+        # the hits that are not part of a ship known to be sunk, the ones that are,
+        # the last shot if it was a hit, and the ships remaining at the last move,
+        # which together let new_next_move work out which cells a sunk ship was on
+        self.live_hits = set(self.hits)
+        self.sunk_cells = set()
+        self.last_hit = None
+        self.previous_ships = None
+        # the mask of every cell hit or missed, and a DensityMap for each ship length that has
+        # been searched for, which are kept up to date by register_shot
+        self.shot = 0
+        self.hit_mask = 0
+        for x,y in self.hits | self.misses:
+            self.shot |= cell_bit(x,y,self.size)
+        for x,y in self.hits:
+            self.hit_mask |= cell_bit(x,y,self.size)
+        self.densities = {}
+        if move_cache is None:
+            move_cache = MoveCache()
+        self.move_cache = move_cache
+        self.opening_book = opening_book
+        self.endgame_threshold = endgame_threshold
+        if self.backend == 'numpy':
+            self.shot_grid = np.zeros((self.size,self.size),dtype=bool)
+            for x,y in self.hits | self.misses:
+                self.shot_grid[y,x] = True
+
+    def __getstate__(self)->dict:
+        '''returns the state of the AI to pickle, leaving out the move cache, which is shared
+        by the AIs of a process, the DensityMaps are kept so they are not counted again
+        Returns:
+            dict: the attributes of the AI'''
+        state = self.__dict__.copy()
+        state['move_cache'] = None
+        return state
+
+    def __setstate__(self,state:dict):
+        '''restores a pickled AI, which uses the move cache of the process it is loaded in
+        Args:
+            state (dict): the attributes of the AI'''
+        self.__dict__.update(state)
+        self.move_cache = shared_move_cache
 
     def check_if_in_bounds(self,x:int,y:int,length:int,orientation:str)->bool:
         '''
@@ -122,35 +844,32 @@ class mainAI:
     def create_placement_count(self,ship_length:int)->dict[tuple[int,int],int]:
         '''
         places a ship on the board
+        the counts come from the DensityMap for that length, which register_shot keeps up to date
         Args:
             ship_length (int): the length of the ship
         Returns:
             dict[tuple[int,int],int]: the dictionary of coordinates and their counts
         '''
-        # creates a dictionary of all the coordinates,counts set to 0
-        count ={(x,y):0 for x in range(self.size) for y in range(self.size)}
-        for y in range(self.size):
-            for x in range(self.size):
-                if (x,y) in self.hits or (x,y) in self.misses:
-                    #if the coordinate has been hit or missed, it cannot be a ship,
-                    #so we skip it
-                    continue
-                for o in ['horizontal','vertical']:
-                    if (self.check_if_in_bounds(x,y,ship_length,o) is False
-                        or self.check_if_offset_in_list(x,y,ship_length,o,self.misses) is False
-                        or self.check_if_offset_in_list(x,y,ship_length,o,self.hits) is False):
-                        # if the ship is out of bounds or the offset is in the misses list,
-                        # or the hits list,
-                        # it cannot be a ship, so we skip it
-                        continue
-                    else:
-                        for i in range(ship_length):
-                            if o == 'horizontal':
-                                count[(x+i,y)] +=1 # add 1 to the count of the coordinate
-
-                            else:
-                                count[(x,y+i)]+=1
-        return count
+        if self.backend == 'numpy':
+            counts = numpy_placement_count(self.shot_grid,ship_length)
+            return {(x,y):int(counts[y,x]) for x in range(self.size) for y in range(self.size)}
+        counts = self.density(ship_length).counts
+        return {(x,y):counts[y*self.size+x] for x in range(self.size) for y in range(self.size)}
+
+    def density(self,ship_length:int)->DensityMap:
+        '''
+        returns the DensityMap for a ship length, creating it from the shots so far the
+        first time that length is searched for
+        Args:
+            ship_length (int): the length of the ship
+        Returns:
+            DensityMap: the placement counts for that length
+        '''
+        density = self.densities.get(ship_length)
+        if density is None:
+            density = DensityMap(self.size,max(ship_length,0),self.shot)
+            self.densities[ship_length] = density
+        return density
 
     def add_NSEW_to_queue(self,coord:tuple[int,int]):
         '''
@@ -165,61 +884,314 @@ class mainAI:
         x,y = coord
         # add each north east south west of the hit to the queue, as long as it is within
         # the bounds of the board and has not been hit or missed before
-        if x+1 < self.size and (x+1,y) not in self.hits and (x+1,y) not in self.misses:
-            self.queue.append((x+1,y))
-        if x-1 >= 0 and (x-1,y) not in self.hits and (x-1,y) not in self.misses:
-            self.queue.append((x-1,y))
-        if y+1 < self.size and (x,y+1) not in self.hits and (x,y+1) not in self.misses:
-            self.queue.append((x,y+1))
-        if y-1 >= 0 and (x,y-1) not in self.hits and (x,y-1) not in self.misses:
-            self.queue.append((x,y-1))
-    def generate_hit_search(self):
-        '''
-        this function generates a random attack that has not been used before
-        Args:
-            previous_attacks (list): the list of previous attacks
-            size (int): the size of the board
+        for neighbour_x,neighbour_y in ((x+1,y),(x-1,y),(x,y+1),(x,y-1)):
+            if (0 <= neighbour_x < self.size and 0 <= neighbour_y < self.size
+                    and not self.is_shot((neighbour_x,neighbour_y))):
+                self.queue.append((neighbour_x,neighbour_y))
+
+    def is_shot(self,coord:tuple[int,int])->bool:
+        '''returns True if the cell has been hit or missed
+        Args:
+            coord (tuple[int,int]): the coordinates of the cell'''
+        return self.shot >> (coord[1]*self.size+coord[0]) & 1 == 1
+
+    def generate_hit_search(self,deadline:float = None):
+        '''
+        this function generates the search coordinate with the highest placement count,
+        and if there is a deadline, refines it by sampling fleet layouts until the deadline
+        a state that has been searched before is answered from the move cache
+        Args:
+            deadline (float): the time.time() by which the move must be chosen, or None to
+            only use the placement counts (default None)
+        Returns:
+            tuple[int,int]: the coordinates of the attack
+        '''
+        key = self.state_key(refined=deadline is not None and self.samples > 0)
+        move = self.move_cache.get(key)
+        if move is None:
+            move = self.search(deadline)
+            self.move_cache.put(key,move)
+        return move
+
+    def state_key(self,refined:bool)->tuple:
+        '''
+        returns a hashable encoding of everything the search move depends on
+        Args:
+            refined (bool): whether the move is refined by sampling layouts
+        Returns:
+            tuple: the board size, the hit and miss masks, the ships remaining and the fleet
+        '''
+        return (self.size,self.hit_mask,self.shot & ~self.hit_mask,
+                tuple(sorted(self.ships.items())),tuple(sorted(self.fleet.items())),refined)
+
+    def search(self,deadline:float = None)->tuple[int,int]:
+        '''
+        this function does the search for generate_hit_search without using the move cache
+        Args:
+            deadline (float): the time.time() by which the move must be chosen, or None to
+            only use the placement counts (default None)
+        Returns:
+            tuple[int,int]: the coordinates of the attack
+        '''
+        lattice = self.hunt_cells()
+        if self.backend == 'numpy':
+            added_grid = np.zeros((self.size,self.size),dtype=np.int64)
+            for ship_length in self.ships.values():
+                added_grid += numpy_placement_count(self.shot_grid,ship_length)
+            added_counts = added_grid.ravel().tolist()
+            score = added_counts.__getitem__
+        else:
+            # add the counts together, only for the cells that are scored
+            counts = [self.density(ship_length).counts
+                      for ship_length in self.ships.values() if ship_length > 0]
+            def score(cell):
+                return sum(count[cell] for count in counts)
+        best = self.best_cell(score,lattice)
+        if best is None and lattice is not search_order(self.size):
+            best = self.best_cell(score,search_order(self.size))
+        if best is None:
+            # nothing scores, so take the first cell that has not been shot
+            best = next((cell for cell in search_order(self.size)
+                         if not self.shot >> cell & 1),0)
+        best_coord = (best % self.size,best // self.size)
+        if deadline is None:
+            return best_coord
+        return self.refine_search(best_coord,deadline)
+
+    def hunt_cells(self)->tuple:
+        '''
+        this function returns the cells worth scoring when searching for new ships
+        every ship left is at least as long as the smallest one left, k, so each of them covers
+        a cell where (x+y) is a multiple of k, and only that lattice needs to be scored
+        while a ship that has been hit is not sunk, every cell is scored
+        Returns:
+            tuple[int]: the cell numbers (y*size+x), in the order ties are broken
+        '''
+        if self.live_hits:
+            return search_order(self.size)
+        lengths = [max(self.fleet.get(name,left),left)
+                   for name,left in self.ships.items() if left > 0]
+        if not lengths or min(lengths) <= 1:
+            return search_order(self.size)
+        return parity_cells(self.size,min(lengths))
+
+    def best_cell(self,score,cells)->int:
+        '''
+        returns the unshot cell with the highest score, ties going to the first one
+        Args:
+            score (callable): gives the score of a cell number
+            cells (tuple[int]): the cell numbers (y*size+x) to choose from
+        Returns:
+            int: the best cell number, or None if no unshot cell scores above 0
+        '''
+        best = None
+        best_score = 0
+        for cell in cells:
+            if self.shot >> cell & 1:
+                continue
+            cell_score = score(cell)
+            if cell_score > best_score:
+                best = cell
+                best_score = cell_score
+        return best
+
+    def refine_search(self,best_coord:tuple[int,int],deadline:float)->tuple[int,int]:
+        '''
+        this function improves on a search coordinate until the deadline, by sampling complete
+        fleet layouts consistent with the hits, misses and remaining ships with a
+        PosteriorSampler, and picking the unshot cell most likely to hold a ship
+        the placement counts score each ship on its own, so the samples account for the ships
+        not being able to overlap and for the hits they have already taken
+        Args:
+            best_coord (tuple[int,int]): the coordinates to return if nothing better is found
+            deadline (float): the time.time() by which the move must be chosen
         Returns:
             tuple[int,int]: the coordinates of the attack
         '''
-        counts = []
-        for ship_length in self.ships.values():
-            counts.append(self.create_placement_count(ship_length))
-        added_counts = {coord:0 for coord in counts[0]} #creates a dictionary of all the coordinates
-                                                        #where their count is 0
-        # add the counts together
-        for count in counts:
-            for coord in count:
-                added_counts[coord]+=count[coord]
-        return max(added_counts,key=added_counts.get) # finds the max value in the dictionary
-
-    def new_next_move(self,ships)->tuple[int,int]:
+        if self.samples <= 0 or time.time() >= deadline:
+            return best_coord
+        sampler = PosteriorSampler(self.size,self.fleet,self.ships,self.hit_mask,
+                                   self.shot & ~self.hit_mask,seed=self.rng.getrandbits(32))
+        cell_counts,accepted = sampler.tally(self.samples,deadline)
+        if accepted == 0:
+            return best_coord
+        best = self.best_cell(cell_counts.__getitem__,self.hunt_cells())
+        if best is None:
+            best = self.best_cell(cell_counts.__getitem__,search_order(self.size))
+        if best is None:
+            return best_coord
+        return (best % self.size,best // self.size)
+
+    def new_next_move(self,ships,refine:bool = True)->tuple[int,int]:
         ''' 
 
         this function generates next attack,
-        it is the end of the queue if it is not empty
-        or the optimal search coordinate if it is empty
+        it is solved exactly if few enough ship cells are left,
+        it follows up the hits that are not part of a sunk ship if there are any,
+        the opening book move if the game is still in the book,
+        or the optimal search coordinate if it is empty,
+        which is chosen within time_allowed seconds of the call
         Args:
             ships (dict): the dictionary of ships remaining
+            refine (bool): False to choose the move without solving the endgame or sampling
+            layouts, from the placement counts alone, which is cached apart from the refined
+            moves (default True)
         '''
+        self.update_sunk_ships(ships)
         self.ships = ships
-        if len(self.queue) ==0:
-            # there are no moves in the queue, so search for new leads
-            return self.generate_hit_search()
-        else:
-            coord = self.queue.pop(0)# take from the front of the queue
-        return coord
+        self.start = time.time()
+        if refine and 0 < sum(left for left in ships.values() if left > 0) <= self.endgame_threshold:
+            # only the ships left are enumerated, so the hits of sunk ships are ruled out
+            # along with the misses
+            live_mask = 0
+            for x,y in self.live_hits:
+                live_mask |= cell_bit(x,y,self.size)
+            afloat = {name:left for name,left in ships.items() if left > 0}
+            coord = EndgameSolver(self.size,self.fleet,afloat,live_mask,self.shot & ~live_mask,
+                                  deadline=self.start+self.time_allowed).solve()
+            if coord is not None and not self.is_shot(coord):
+                return coord
+        coord = self.target_move()
+        if coord is not None:
+            return coord
+        if self.opening_book is not None:
+            move = self.opening_book.move_for(self.size,self.fleet,self.hits,self.misses)
+            if move is not None:
+                return move
+            # a game never comes back into the book once it has left it
+            self.opening_book = None
+        # there are no moves in the queue, so search for new leads
+        return self.generate_hit_search(deadline=self.start+self.time_allowed if refine else None)
+
+    def target_move(self)->tuple[int,int]:
+        '''
+        this function chooses a move around the hits that are not part of a sunk ship
+        when two or more of those hits are in a line, the ship must lie along it,
+        so the cells past each end of the longest line are tried first,
+        otherwise the NSEW cells in the queue are tried in the order they were added
+        Returns:
+            tuple[int,int]: the coordinates of the attack, or None if there is nothing to target
+        '''
+        if not self.live_hits:
+            self.queue.clear()
+            return None
+        best_length = 1
+        best_ends = []
+        for x,y in sorted(self.live_hits):
+            for dx,dy in ((1,0),(0,1)):
+                if (x-dx,y-dy) in self.live_hits:
+                    continue # not the start of a line
+                length = 1
+                while (x+dx*length,y+dy*length) in self.live_hits:
+                    length += 1
+                if length < best_length or length == 1:
+                    continue
+                ends = [end for end in ((x-dx,y-dy),(x+dx*length,y+dy*length))
+                        if 0 <= end[0] < self.size and 0 <= end[1] < self.size
+                        and not self.is_shot(end)]
+                if not ends:
+                    continue # both ends are blocked, so the hits are more than one ship
+                if length > best_length:
+                    best_length = length
+                    best_ends = []
+                best_ends.extend(ends)
+        if best_ends:
+            return best_ends[0]
+        while len(self.queue) > 0:
+            coord = self.queue.popleft() # take from the front of the queue
+            # cells can be shot after they are queued, and a queued cell is no longer worth
+            # trying once the ship next to it is sunk, so those are skipped here
+            # rather than searched for and removed when they change
+            if not self.is_shot(coord) and self.next_to_live_hit(coord):
+                return coord
+        # the queue was cleared while there are hits left to follow up, so queue them again
+        for coord in sorted(self.live_hits):
+            self.add_NSEW_to_queue(coord)
+        if len(self.queue) > 0:
+            return self.queue.popleft()
+        return None
+
+    def next_to_live_hit(self,coord:tuple[int,int])->bool:
+        '''returns True if a cell is next to a hit that is not part of a sunk ship
+        Args:
+            coord (tuple[int,int]): the coordinates of the cell'''
+        x,y = coord
+        return any(neighbour in self.live_hits
+                   for neighbour in ((x+1,y),(x-1,y),(x,y+1),(x,y-1)))
+
+    def update_sunk_ships(self,ships:dict[str,int]):
+        '''
+        this function works out which cells a ship is on when the last shot sank it,
+        which is the one ship whose count has just reached 0, and removes them from
+        the hits that are still followed up
+        the ship is taken to be the line of its length through the last hit made up of
+        hits that are not part of another sunk ship, preferring lines that end at the last hit
+        Args:
+            ships (dict): the dictionary of ships remaining
+        '''
+        previous = self.previous_ships
+        self.previous_ships = dict(ships)
+        if previous is None or self.last_hit is None:
+            return
+        for name,left in ships.items():
+            if left != 0 or previous.get(name,0) == 0 or name not in self.fleet:
+                continue
+            cells = self.sunk_ship_cells(self.last_hit,self.fleet[name])
+            if cells is not None:
+                self.live_hits.difference_update(cells)
+                self.sunk_cells.update(cells)
+        if not self.live_hits:
+            self.queue.clear()
+
+    def sunk_ship_cells(self,coord:tuple[int,int],ship_length:int)->list[tuple[int,int]]:
+        '''
+        this function finds the cells of a ship that was sunk by a shot
+        Args:
+            coord (tuple[int,int]): the coordinates of the shot that sank the ship
+            ship_length (int): the length of the ship
+        Returns:
+            list[tuple[int,int]]: the cells of the ship, or None if no line of hits fits
+        '''
+        x,y = coord
+        lines = []
+        for dx,dy in ((1,0),(0,1)):
+            for offset in range(ship_length):
+                cells = [(x+dx*(i-offset),y+dy*(i-offset)) for i in range(ship_length)]
+                if all(cell in self.live_hits for cell in cells):
+                    lines.append(cells)
+        if not lines:
+            return None
+        for cells in lines:
+            if coord in (cells[0],cells[-1]):
+                return cells
+        return lines[0]
+
     def add_hit(self,coord:tuple[int,int]):
-        '''adds coord to the list of coords hit and adds the NSEW coords to the queue to be searched
+        '''adds coord to the set of coords hit and adds the NSEW coords to the queue to be searched
         Args:
             coord (tuple[int,int]): the coordinates of the hit'''
-        self.hits.append(coord)
+        self.hits.add(coord)
+        self.live_hits.add(coord)
+        self.last_hit = coord
+        self.hit_mask |= cell_bit(coord[0],coord[1],self.size)
+        self.record_shot(coord)
         self.add_NSEW_to_queue(coord)
     def add_miss(self,coord:tuple[int,int]):
-        '''adds coord to the list of coords missed
+        '''adds coord to the set of coords missed
         Args:
             coord (tuple[int,int]): the coordinates of the miss'''
-        self.misses.append(coord)
+        self.misses.add(coord)
+        self.last_hit = None
+        self.record_shot(coord)
+    def record_shot(self,coord:tuple[int,int]):
+        '''marks a cell as shot and removes the placements it rules out from every DensityMap
+        Args:
+            coord (tuple[int,int]): the coordinates of the shot'''
+        self.shot |= cell_bit(coord[0],coord[1],self.size)
+        if self.backend == 'numpy':
+            self.shot_grid[coord[1],coord[0]] = True
+        for density in self.densities.values():
+            density.register_shot(coord)
     def register_shot(self,coord:tuple[int,int],hit:bool):
         '''registers the shot
         Args:
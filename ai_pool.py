@@ -0,0 +1,249 @@
+'''
+AI Pool Module
+
+This module chooses the AI's moves in a pool of worker processes, so a request waiting on a
+move does not hold the server's process while the AI searches. The AI is sent to a worker with
+the ships left, and the worker sends back the move and the AI as it is after choosing it. The
+number of moves waiting or running is bounded, and each move has a timeout, past either of which
+the move is chosen in the server's process without any time to search.
+
+The AI's next move only depends on its own shots and the ships it has hit, so it is known as
+soon as it has registered a shot. speculate starts choosing that move in a worker while the
+player thinks about their next attack, and next_move hands it over when it is asked for.
+
+Classes:
+- AIPool: The worker processes, with the bound on the moves waiting and the timeout of a move.
+
+Functions:
+- choose_move(ai: mainAI, ships: dict[str, int]) -> tuple[tuple[int, int], mainAI]:
+  Chooses a move in a worker and returns it with the AI.
+
+- quick_move(ai: mainAI, ships: dict[str, int]) -> tuple[int, int]:
+  Chooses a move with no time to search, from the density counts alone.
+
+- position(ai: mainAI, ships: dict[str, int]) -> tuple:
+  Returns what the AI's next move depends on, to check a speculated move is still wanted.
+
+Usage:
+- To choose a move, replacing the AI with the one that chose it:
+    pool = AIPool(workers=4, max_pending=32, timeout=3)
+    move, ai = pool.next_move(ai, ships)
+- To choose the next move while the player thinks, once the AI has registered its shot:
+    pool.speculate(gamecode, ai, ships)
+    move, ai = pool.next_move(ai, ships, key=gamecode)
+'''
+
+import multiprocessing
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from aiClass import mainAI
+
+
+def choose_move(ai:mainAI,ships:dict[str,int])->tuple[tuple[int,int],mainAI]:
+    '''
+    chooses a move, this runs in a worker process
+    Args:
+        ai (mainAI): the AI, which is a copy of the one in the server
+        ships (dict): the ships left on the board the AI is attacking
+    Returns:
+        tuple: the move, and the AI after choosing it
+    '''
+    move = ai.new_next_move(ships)
+    return move,ai
+
+
+def quick_move(ai:mainAI,ships:dict[str,int])->tuple[int,int]:
+    '''
+    chooses a move with no time to search, so it is only as good as the density counts,
+    which takes a few milliseconds, the move is cached apart from the searched moves so it
+    is never handed to an AI that has time to search
+    Args:
+        ai (mainAI): the AI
+        ships (dict): the ships left on the board the AI is attacking
+    Returns:
+        tuple[int,int]: the move
+    '''
+    return ai.new_next_move(ships,refine=False)
+
+
+def position(ai:mainAI,ships:dict[str,int])->tuple:
+    '''
+    returns what the AI's next move depends on, which only changes when it registers a shot
+    Args:
+        ai (mainAI): the AI
+        ships (dict): the ships left on the board the AI is attacking
+    Returns:
+        tuple: the masks of the cells hit and shot, and the ships left
+    '''
+    return (ai.hit_mask,ai.shot,tuple(sorted(ships.items())))
+
+
+class AIPool:
+    '''
+    this class chooses the AI's moves in a pool of worker processes, which are started the
+    first time a move is chosen, and counts how the moves were chosen in moves, speculated,
+    saturated, timeouts and broken
+    '''
+
+    def __init__(self,workers:int = None,max_pending:int = None,timeout:float = 3.0,
+                 max_speculations:int = 1000):
+        '''
+        this function initialises the pool
+        Args:
+            workers (int): the number of worker processes (default None, one per CPU)
+            max_pending (int): the most moves waiting or running at once, past which a move is
+            chosen with quick_move (default None, four per worker)
+            timeout (float): the seconds a request waits for a move before choosing it with
+            quick_move, which should be longer than the AI's time_allowed (default 3)
+            max_speculations (int): the most speculated moves kept waiting to be asked for,
+            past which the oldest is dropped (default 1000)
+        '''
+        self.workers = workers or os.cpu_count()
+        self.max_pending = 4*self.workers if max_pending is None else max_pending
+        self.timeout = timeout
+        self.slots = threading.BoundedSemaphore(self.max_pending) if self.max_pending else None
+        self.max_speculations = max_speculations
+        # the key of each game to the position and future of its speculated move
+        self.speculations = OrderedDict()
+        self.executor = None
+        self.lock = threading.Lock()
+        self.moves = 0
+        self.speculated = 0
+        self.saturated = 0
+        self.timeouts = 0
+        self.broken = 0
+
+    def get_executor(self)->ProcessPoolExecutor:
+        '''returns the worker processes, starting them if they have not been started'''
+        with self.lock:
+            if self.executor is None:
+                # the workers are spawned, so they do not inherit the server's sockets or
+                # its event loop
+                self.executor = ProcessPoolExecutor(
+                    max_workers=self.workers,mp_context=multiprocessing.get_context('spawn'))
+            return self.executor
+
+    def submit(self,ai:mainAI,ships:dict[str,int]):
+        '''
+        starts choosing a move in a worker if fewer than max_pending moves are waiting or running
+        Args:
+            ai (mainAI): the AI
+            ships (dict): the ships left on the board the AI is attacking
+        Returns:
+            Future: the future of the move and the AI, or None if the pool is saturated
+        Raises:
+            Exception: whatever stopped the workers being given the move, after the pool
+            is dropped so the next move starts it again
+        '''
+        if self.slots is None or not self.slots.acquire(blocking=False):
+            return None
+        try:
+            future = self.get_executor().submit(choose_move,ai,ships)
+        except Exception:
+            # the workers could not be started or have broken, such as when the server is run
+            # as a script the workers cannot import, so the pool is started again next time
+            self.slots.release()
+            with self.lock:
+                self.executor = None
+            raise
+        # the slot is only freed when the worker is done, even if the request stopped waiting
+        future.add_done_callback(lambda _: self.slots.release())
+        return future
+
+    def speculate(self,key:str,ai:mainAI,ships:dict[str,int]):
+        '''
+        starts choosing the AI's next move before it is asked for, this is skipped if the pool
+        is saturated, so speculating never makes a move that is asked for wait
+        Args:
+            key (str): the key of the game, which next_move is given to find the move
+            ai (mainAI): the AI, which should not change until the move is asked for
+            ships (dict): the ships left on the board the AI is attacking
+        '''
+        try:
+            future = self.submit(ai,ships)
+        except Exception:
+            return
+        if future is None:
+            return
+        with self.lock:
+            self.speculations[key] = (position(ai,ships),future)
+            self.speculations.move_to_end(key)
+            while len(self.speculations) > self.max_speculations:
+                _,(_,dropped) = self.speculations.popitem(last=False)
+                dropped.cancel()
+
+    def discard(self,key:str):
+        '''drops the speculated move of a game, such as when it is replaced by a new one'''
+        with self.lock:
+            speculation = self.speculations.pop(key,None)
+        if speculation is not None:
+            speculation[1].cancel()
+
+    def next_move(self,ai:mainAI,ships:dict[str,int],key:str = None)->tuple[tuple[int,int],mainAI]:
+        '''
+        chooses a move in a worker, or in this process with quick_move if too many moves
+        are waiting or the worker takes longer than the timeout
+        Args:
+            ai (mainAI): the AI
+            ships (dict): the ships left on the board the AI is attacking
+            key (str): the key of the game, to hand over the move speculated for it if the AI
+            has not changed since (default None)
+        Returns:
+            tuple: the move, and the AI to keep, which is the one from the worker unless
+            the move was chosen in this process
+        '''
+        future = None
+        speculated = False
+        if key is not None:
+            with self.lock:
+                speculation = self.speculations.pop(key,None)
+            if speculation is not None:
+                if speculation[0] == position(ai,ships):
+                    future = speculation[1]
+                    speculated = True
+                else:
+                    speculation[1].cancel()
+        if future is None:
+            try:
+                future = self.submit(ai,ships)
+            except Exception:
+                self.broken += 1
+                return quick_move(ai,ships),ai
+        if future is None:
+            self.saturated += 1
+            return quick_move(ai,ships),ai
+        try:
+            move,worker_ai = future.result(timeout=self.timeout)
+        except TimeoutError:
+            future.cancel()
+            self.timeouts += 1
+            return quick_move(ai,ships),ai
+        except BrokenProcessPool:
+            # a worker died, so the pool is started again for the next move
+            with self.lock:
+                self.executor = None
+            self.broken += 1
+            return quick_move(ai,ships),ai
+        self.moves += 1
+        if speculated:
+            self.speculated += 1
+        return move,worker_ai
+
+    def stats(self)->dict[str,int]:
+        '''returns the moves chosen by the workers, the number of them that were speculated,
+        and the moves chosen with quick_move because the pool was saturated, a move timed out,
+        or the workers could not be started or broke'''
+        return {'moves':self.moves,'speculated':self.speculated,'saturated':self.saturated,
+                'timeouts':self.timeouts,'broken':self.broken}
+
+    def shutdown(self):
+        '''stops the worker processes'''
+        with self.lock:
+            if self.executor is not None:
+                self.executor.shutdown(wait=False,cancel_futures=True)
+                self.executor = None
+            self.speculations.clear()
@@ -0,0 +1,154 @@
+"""
+Batch Game Module
+
+This module plays thousands of games of battleships in lockstep, with every board and fleet
+held in stacked numpy arrays. Each step fires one shot in every game that is still going, with
+vectorized versions of `game_engine.attack` and `game_engine.check_if_game_over`, and gives back
+which shots hit, which sank a ship and which games are over for every game at once. Games that
+finish are dropped from the list of active games, the arrays of the other games stay where they
+are.
+
+Classes:
+    - `BatchGame`:
+        The boards, ships left and shots of many games, stepped together.
+
+Usage:
+    - To play ten thousand games of random attacks:
+        ```
+        games = BatchGame(10, {'ship1': 3, 'ship2': 2}, 10000, seed=0)
+        while games.active.size:
+            x, y = games.random_attack()
+            hits, sunk, over = games.step(x, y)
+        games.shots_to_win # the shots each game took
+        ```
+
+Notes:
+    - numpy is needed for this module, unlike the rest of the game.
+"""
+
+from array import array
+
+try:
+    import numpy as np
+except ImportError: # numpy is only needed to play games in batches
+    np = None
+
+from bitboard import placement_index
+from components import generate_layouts
+
+# the ship number of a cell with no ship left on it
+EMPTY = -1
+
+
+class BatchGame:
+    '''
+    this class holds the boards of many games as numpy arrays and fires one shot in each of them
+    at a time, the arrays have one row per game:
+        ship_at: the number of the ship on each cell, y*size+x, or EMPTY once hit or if there is none
+        remaining: the cells left of each ship, in the order of the ships dictionary
+        shot: if each cell has been fired at
+        shots_to_win: the shots a game took once it is over, 0 until then
+    '''
+
+    def __init__(self,size:int,ships:dict[str,int],games:int,seed:int = None,
+                 layouts:array = None):
+        '''
+        this function initialises the games with a random layout each
+        Args:
+            size (int): the size of the boards
+            ships (dict): the dictionary of battleships names and lengths
+            games (int): the number of games
+            seed (int): the seed used to generate the layouts (default None)
+            layouts (array): the layouts from components.generate_layouts to use instead
+            of generating them (default None)
+        Raises:
+            ImportError: if numpy is not installed
+        '''
+        if np is None:
+            raise ImportError('BatchGame needs numpy to be installed')
+        if layouts is None:
+            layouts = generate_layouts(games,size,ships,seed=seed)
+        self.size = size
+        self.names = list(ships)
+        self.games = games
+        placement_ids = np.frombuffer(layouts,dtype=np.uint16 if layouts.typecode == 'H'
+                                      else np.uint32).reshape(games,len(ships))
+        self.ship_at = np.full((games,size*size),EMPTY,dtype=np.int8)
+        rows = np.arange(games)[:,None]
+        for number,length in enumerate(ships.values()):
+            # the cell numbers of every placement of the ship, one row per placement
+            cells = np.array([[y*size+x for x,y in placement.cells]
+                              for placement in placement_index(size,length)],dtype=np.intp)
+            self.ship_at[rows,cells[placement_ids[:,number]]] = number
+        self.remaining = np.tile(np.array(list(ships.values()),dtype=np.int16),(games,1))
+        self.shot = np.zeros((games,size*size),dtype=bool)
+        self.shots_to_win = np.zeros(games,dtype=np.int32)
+        self.shots_fired = 0
+        # the numbers of the games still going, in the order step expects their shots
+        self.active = np.arange(games)
+
+    def attack(self,x,y)->tuple:
+        '''
+        processes one attack in each active game, like game_engine.attack on every board at once
+        Args:
+            x (np.ndarray): the x coordinate of the attack in each active game
+            y (np.ndarray): the y coordinate of the attack in each active game
+        Returns:
+            tuple[np.ndarray,np.ndarray]: if each attack hit, and if it sank the ship it hit
+        '''
+        cells = np.asarray(y)*self.size + np.asarray(x)
+        games = self.active
+        ship = self.ship_at[games,cells]
+        hits = ship != EMPTY
+        hit_games = games[hits]
+        hit_ships = ship[hits]
+        self.ship_at[hit_games,cells[hits]] = EMPTY
+        # every game fires once, so no ship is counted twice in this subtraction
+        self.remaining[hit_games,hit_ships] -= 1
+        sunk = np.zeros_like(hits)
+        sunk[hits] = self.remaining[hit_games,hit_ships] == 0
+        self.shot[games,cells] = True
+        return hits,sunk
+
+    def check_if_game_over(self):
+        '''
+        checks which active games are over, like game_engine.check_if_game_over on each of them
+        Returns:
+            np.ndarray: if each active game has no ship cells left
+        '''
+        return ~self.remaining[self.active].any(axis=1)
+
+    def step(self,x,y)->tuple:
+        '''
+        fires one shot in each active game, then retires the games that are over
+        Args:
+            x (np.ndarray): the x coordinate of the attack in each active game
+            y (np.ndarray): the y coordinate of the attack in each active game
+        Returns:
+            tuple[np.ndarray,np.ndarray,np.ndarray]: if each attack hit, if it sank a ship and
+            if the game is over, in the order of active before the step
+        '''
+        hits,sunk = self.attack(x,y)
+        self.shots_fired += 1
+        over = self.check_if_game_over()
+        self.shots_to_win[self.active[over]] = self.shots_fired
+        # only the list of active games shrinks, the boards of the other games are not moved
+        self.active = self.active[~over]
+        return hits,sunk,over
+
+    def random_attack(self,rng = None)->tuple:
+        '''
+        chooses a random cell that has not been fired at in each active game,
+        like mp_game_engine.generate_attack
+        Args:
+            rng (np.random.Generator): the random number generator to use
+            (default None, a new unseeded one)
+        Returns:
+            tuple[np.ndarray,np.ndarray]: the x and y coordinates of the attacks
+        '''
+        if rng is None:
+            rng = np.random.default_rng()
+        noise = rng.random((self.active.size,self.size*self.size))
+        noise[self.shot[self.active]] = -1
+        cells = noise.argmax(axis=1)
+        return cells % self.size,cells // self.size
@@ -0,0 +1,278 @@
+"""
+Bitboard Module
+
+This module provides an integer bitmask representation of a game board, as an optional
+alternative to the list of lists created by `initialise_board`. Each cell of the board is
+one bit of a python int, at index y*size + x, so placement checks, attacks and game over
+checks are a few bitwise operations instead of walking the nested lists.
+
+Classes:
+    - `BitBoard`:
+        A board holding one mask per ship and an occupancy mask of all unhit ship cells.
+
+Functions:
+    - `placement_index(size: int, ship_length: int) -> tuple[Placement, ...]`:
+        Returns every legal placement of a ship on an empty board, built once and cached.
+
+    - `placement_lookup(size: int, ship_length: int) -> Dict[tuple[int, int, str], int]`:
+        Returns the mask of every legal placement keyed on (x, y, orientation), built once
+        and cached.
+
+    - `cell_bit(x: int, y: int, size: int) -> int`:
+        Returns the bit for the cell at (x, y) on a board of the given size.
+
+    - `ship_mask(x: int, y: int, ship_length: int, size: int,
+                    orientation: str = 'horizontal') -> int`:
+        Returns the mask of the cells covered by a ship, without checking the bounds.
+
+    - `board_to_bitboard(board: List[List]) -> BitBoard`:
+        Converts a list of lists board into a BitBoard.
+
+    - `bitboard_to_board(bitboard: BitBoard) -> List[List]`:
+        Converts a BitBoard into a list of lists board.
+
+Usage:
+    - To place a ship and attack it:
+        ```
+        board = BitBoard(size=10)
+        board.place_battleship(0, 0, 3, 'ship 1', orientation='vertical')
+        board.attack((0, 1)) # returns 'ship 1'
+        ```
+    - To convert between the two board formats:
+        ```
+        bitboard = board_to_bitboard(initialise_board(10))
+        board = bitboard_to_board(bitboard)
+        ```
+"""
+
+from collections import namedtuple
+from functools import lru_cache
+from typing import List, Dict
+
+# a legal placement of a ship on an empty board, with the mask and coordinates of its cells
+Placement = namedtuple('Placement',['x','y','orientation','mask','cells'])
+
+
+def cell_bit(x:int,y:int,size:int)->int:
+    '''returns the bit for the cell at (x,y)
+    Args:
+        x (int): the x coordinate of the cell
+        y (int): the y coordinate of the cell
+        size (int): the width and height of the board
+    Returns:
+        int: the mask with only the bit of that cell set
+    Raises:
+        IndexError: if the cell is off the board, as its bit would be a cell of another row
+    '''
+    if not (0 <= x < size and 0 <= y < size):
+        raise IndexError(f'({x},{y}) is off a board of size {size}')
+    return 1 << (y*size + x)
+
+
+def ship_mask(x:int,y:int,ship_length:int,size:int,orientation:str='horizontal')->int:
+    '''returns the mask of the cells a ship covers, this does not check the bounds
+    Args:
+        x (int): the x coordinate of the start of the ship
+        y (int): the y coordinate of the start of the ship
+        ship_length (int): the length of the ship
+        size (int): the width and height of the board
+        orientation (str): the orientation of the ship (default 'horizontal')
+    Returns:
+        int: the mask of the cells covered by the ship
+    Raises:
+        ValueError: if the orientation is neither 'horizontal' nor 'vertical'
+    '''
+    if orientation == 'horizontal':
+        # a run of ship_length bits, shifted to the start of the ship
+        return ((1 << ship_length) - 1) << (y*size + x)
+    elif orientation == 'vertical':
+        mask = 0
+        for i in range(ship_length):
+            mask |= 1 << ((y+i)*size + x)
+        return mask
+    else:
+        raise ValueError('orientation must be "horizontal" or "vertical"')
+
+
+@lru_cache(maxsize=None)
+def placement_index(size:int,ship_length:int)->tuple:
+    '''returns every legal placement of a ship on an empty board
+
+    The placements are built once for each (size, ship_length) and cached, so callers
+    only need to check each mask against the cells that are already taken.
+    Args:
+        size (int): the width and height of the board
+        ship_length (int): the length of the ship
+    Returns:
+        tuple[Placement]: the placements, in row order with horizontal before vertical
+    '''
+    placements = []
+    for y in range(size):
+        for x in range(size):
+            if x + ship_length <= size:
+                placements.append(Placement(x,y,'horizontal',
+                                            ship_mask(x,y,ship_length,size,'horizontal'),
+                                            tuple((x+i,y) for i in range(ship_length))))
+            if y + ship_length <= size:
+                placements.append(Placement(x,y,'vertical',
+                                            ship_mask(x,y,ship_length,size,'vertical'),
+                                            tuple((x,y+i) for i in range(ship_length))))
+    return tuple(placements)
+
+
+@lru_cache(maxsize=None)
+def placement_lookup(size:int,ship_length:int)->Dict[tuple[int,int,str],int]:
+    '''returns the mask of every legal placement keyed on (x, y, orientation)
+
+    A key that is missing is a placement that goes off the board.
+    Args:
+        size (int): the width and height of the board
+        ship_length (int): the length of the ship
+    Returns:
+        dict[tuple[int,int,str],int]: the placement masks
+    '''
+    return {(p.x,p.y,p.orientation):p.mask for p in placement_index(size,ship_length)}
+
+
+class BitBoard:
+    '''
+    this class represents a board as integer bitmasks,
+    one mask per ship and an occupancy mask of every unhit ship cell
+    '''
+
+    def __init__(self,size:int=10):
+        '''
+        this function initialises an empty board
+        Args:
+            size (int): the width and height of the board (default 10)
+        '''
+        self.size = size
+        self.ships:Dict[str,int] = {}
+        self.occupied = 0
+
+    def __len__(self)->int:
+        '''the size of the board, so it can be used where len(board) is used on a list board'''
+        return self.size
+
+    def is_valid_placement(self,x:int,y:int,ship_length:int,
+                           orientation:str='horizontal')->bool:
+        '''
+        checks if a ship can be placed on the board at a given coordinate and orientation
+        Args:
+            x (int): the x coordinate to place the ship at
+            y (int): the y coordinate to place the ship at
+            ship_length (int): the length of the ship to place
+            orientation (str): the orientation of the ship (default 'horizontal')
+        Returns:
+            bool: True if the ship can be placed, False if it cannot
+        Raises:
+            ValueError: if the orientation is neither 'horizontal' nor 'vertical'
+        '''
+        if orientation not in ('horizontal','vertical'):
+            raise ValueError('orientation must be "horizontal" or "vertical"')
+        mask = placement_lookup(self.size,ship_length).get((x,y,orientation))
+        if mask is None:
+            # the ship will go off the board
+            return False
+        return self.occupied & mask == 0
+
+    def place_battleship(self,x:int,y:int,ship_length:int,ship_name:str,
+                         orientation:str='horizontal')->bool:
+        '''
+        places a ship on the board if the placement is valid
+        Args:
+            x (int): the x coordinate of the start of the ship
+            y (int): the y coordinate of the start of the ship
+            ship_length (int): the length of the ship
+            ship_name (str): the name of the ship
+            orientation (str): the orientation of the ship (default 'horizontal')
+        Returns:
+            bool: True if the ship was placed, False if the placement was invalid
+        '''
+        if not self.is_valid_placement(x,y,ship_length,orientation=orientation):
+            return False
+        mask = placement_lookup(self.size,ship_length)[(x,y,orientation)]
+        self.ships[ship_name] = self.ships.get(ship_name,0) | mask
+        self.occupied |= mask
+        return True
+
+    def attack(self,coords:tuple[int,int])->str:
+        '''
+        processes an attack on the board, removing the cell from the ship that was hit
+        Args:
+            coords (tuple[int,int]): the coordinates of the attack
+        Returns:
+            str: the name of the ship that was hit, or None if the attack missed
+        '''
+        bit = cell_bit(coords[0],coords[1],self.size)
+        if self.occupied & bit == 0:
+            return None
+        self.occupied &= ~bit
+        for name, mask in self.ships.items():
+            if mask & bit:
+                self.ships[name] = mask & ~bit
+                return name
+        return None
+
+    def remaining(self,ship_name:str)->int:
+        '''returns the number of unhit cells of a ship
+        Args:
+            ship_name (str): the name of the ship
+        Returns:
+            int: the number of cells of that ship that have not been hit'''
+        return self.ships[ship_name].bit_count()
+
+    def is_game_over(self)->bool:
+        '''returns True if every ship cell on the board has been hit'''
+        return self.occupied == 0
+
+    def to_board(self)->List[List]:
+        '''converts the board to the list of lists format used by components
+        Returns:
+            list: a 2D list of None values and ship names
+        '''
+        board = [[None for _ in range(self.size)] for _ in range(self.size)]
+        for name, mask in self.ships.items():
+            while mask:
+                low = mask & -mask # the lowest set bit
+                index = low.bit_length() - 1
+                board[index // self.size][index % self.size] = name
+                mask ^= low
+        return board
+
+    @classmethod
+    def from_board(cls,board:List[List])->'BitBoard':
+        '''creates a BitBoard from a list of lists board
+        Args:
+            board (list): a 2D list of None values and ship names
+        Returns:
+            BitBoard: the board as bitmasks
+        '''
+        bitboard = cls(len(board))
+        for y, row in enumerate(board):
+            for x, cell in enumerate(row):
+                if cell is not None:
+                    bit = cell_bit(x,y,bitboard.size)
+                    bitboard.ships[cell] = bitboard.ships.get(cell,0) | bit
+                    bitboard.occupied |= bit
+        return bitboard
+
+
+def board_to_bitboard(board:List[List])->BitBoard:
+    '''converts a list of lists board into a BitBoard
+    Args:
+        board (list): a 2D list of None values and ship names
+    Returns:
+        BitBoard: the board as bitmasks
+    '''
+    return BitBoard.from_board(board)
+
+
+def bitboard_to_board(bitboard:BitBoard)->List[List]:
+    '''converts a BitBoard into a list of lists board
+    Args:
+        bitboard (BitBoard): the board as bitmasks
+    Returns:
+        list: a 2D list of None values and ship names
+    '''
+    return bitboard.to_board()
@@ -4,12 +4,18 @@ Component Module
 This module provides functions for initializing a game board, creating battleships from a file,
 and placing battleships on the board using different placement algorithms.
 
+Classes:
+    - `FleetRegistry`:
+        A process wide cache of named fleets that re-reads a file when it is modified.
+        The module level `fleets` registry has 'battleships.txt' registered as 'default'.
+
 Functions:
     - `initialise_board(size: int = 10) -> List[List]`: 
         Creates an empty 2D square board with the specified size.
 
     - `create_battleships(filename: str = 'battleships.txt') -> Dict[str, int]`: 
-        Creates a dictionary of battleships from a file.
+        Creates a dictionary of battleships from a file, using the cached copy
+        in the fleet registry unless the file has been modified.
 
     - `place_battleships(board: List[List], ships: Dict[str, int], 
                                 algorithm: str = 'simple') -> List[List]`: 
@@ -18,6 +24,16 @@ Functions:
     - `random_battleship_placement(board: List[List], battleships: Dict[str, int]) -> List[List]`: 
         Places ships with random coordinates and orientation on a board.
 
+    - `sample_fleet_placements(rng: random.Random, size: int, ship_lengths: List[int],
+                                occupied: int = 0) -> List[int]`:
+        Chooses a placement for each ship from the placements that are still legal.
+
+    - `generate_layouts(n: int, size: int, ships: Dict[str, int], seed: int = None) -> array`:
+        Generates many independent random layouts as a compact array of placement ids.
+
+    - `layout_to_board(layouts: array, index: int, size: int, ships: Dict[str, int]) -> List[List]`:
+        Builds the board of one layout made by generate_layouts.
+
     - `simple_battleship_placement(board: List[List], battleships: Dict[str, int]) -> List[List]`: 
         Places ships one on each line from the top left of the board.
 
@@ -32,6 +48,9 @@ Functions:
     - `print_board(board: List[List]) -> None`: 
         Prints a board to the console.
 
+Every function that takes a board also accepts a `BitBoard` from the bitboard module,
+in which case the checks and placements are done with bitwise operations.
+
 Usage:
     - To create a board of size 5 and place two battleships
     on it using the random placement algorithm:
@@ -54,9 +73,19 @@ Usage:
         ```
 """
 
+import os
 import random
+import threading
+from array import array
 from typing import List,Dict
 
+from bitboard import BitBoard, placement_index, placement_lookup
+
+# how many times a fleet is started again when a ship has nowhere left to go
+MAX_FLEET_ATTEMPTS = 100
+# how many placements are picked from the whole index before filtering the legal ones
+QUICK_PICKS = 8
+
 def initialise_board(size = 10)->List[List]:
     '''Creates an empty 2D square board with width and height of size.
 
@@ -72,12 +101,97 @@ def initialise_board(size = 10)->List[List]:
     empty_board = [[None for _ in range(size)] for _ in range(size)]
     return empty_board
 
+class FleetRegistry:
+    '''
+    this class is a process wide cache of the fleets read from battleship files
+
+    Each file is parsed once and kept with its modification time, so later reads only
+    stat the file and copy the cached dictionary, and the file is parsed again if it changes.
+    Fleets can also be registered under a name, so several fleets can be kept side by side.
+    '''
+
+    def __init__(self):
+        '''
+        this function initialises an empty registry
+        '''
+        self._filenames = {}
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def register(self,name:str,filename:str)->None:
+        '''registers a battleship file under a name
+        Args:
+            name (str): the name of the fleet
+            filename (str): the directory of the text file to read ship data from
+        '''
+        self._filenames[name] = filename
+
+    def get(self,name:str = 'default')->Dict[str,int]:
+        '''returns a fresh copy of a named fleet
+        Args:
+            name (str): the name of the fleet (default 'default')
+        Returns:
+            A dictionary of battleships with the name of the ship as the key
+            and the length of the ship as the value
+        Raises:
+            KeyError: if no fleet has been registered with that name
+        '''
+        return self.load(self._filenames[name])
+
+    def load(self,filename:str)->Dict[str,int]:
+        '''returns a fresh copy of the fleet in a file, parsing it only if it has changed
+        Args:
+            filename (str): the directory of the text file to read ship data from
+        Returns:
+            A dictionary of battleships with the name of the ship as the key
+            and the length of the ship as the value
+        '''
+        path = os.path.abspath(filename)
+        stat = os.stat(path)
+        version = (stat.st_mtime_ns,stat.st_size)
+        cached = self._cache.get(path)
+        if cached is None or cached[0] != version:
+            with self._lock:
+                cached = (version,_parse_battleships(path))
+                self._cache[path] = cached
+        return dict(cached[1])
+
+    def clear(self)->None:
+        '''forgets every cached fleet, so each file is parsed again on its next read'''
+        with self._lock:
+            self._cache.clear()
+
+
+def _parse_battleships(filename:str)->Dict[str,int]:
+    '''parses a battleship file, with the name and length of a ship separated by a colon
+    on each line
+    Args:
+        filename : the directory of the text file to read ship data from
+    Returns:
+        A dictionary of battleships with the name of the ship as the key
+        and the length of the ship as the value
+    '''
+    with open(filename,'r', encoding='utf-8') as f:
+        battleships = {}
+        for line in f.readlines():
+            line = line.strip()
+            name, length = line.split(':')
+            battleships[name] = int(length)
+        return battleships
+
+
+fleets = FleetRegistry()
+fleets.register('default','battleships.txt')
+
+
 def create_battleships(filename = 'battleships.txt')->Dict[str,int]:
     '''Creates a dictionary of battleships from a file
 
     Creates a dictionary of battleships from a file, with the name of the 
     ship as the key and the length of the ship as the value
-    by splitting each line on : to extract the name and length of the ship
+    by splitting each line on : to extract the name and length of the ship.
+    The file is only parsed again when it has been modified since the last call,
+    otherwise a copy of the cached fleet from the registry is returned
 
     Args:
         filename : the directory of the text file to read ship data from 
@@ -89,13 +203,7 @@ def create_battleships(filename = 'battleships.txt')->Dict[str,int]:
         A dictionary of battleships with the name of the ship as the key
         and the length of the ship as the value
     '''
-    with open(filename,'r', encoding='utf-8') as f:
-        battleships = {}
-        for line in f.readlines():
-            line = line.strip()
-            name, length = line.split(':')
-            battleships[name] = int(length)
-        return battleships
+    return fleets.load(filename)
 
 
 def place_battleships(board:List[List],ships:Dict[str,int],algorithm:str = 'simple')->List[List]:
@@ -123,27 +231,116 @@ def place_battleships(board:List[List],ships:Dict[str,int],algorithm:str = 'simp
 def random_battleship_placement(board: List[List], battleships: Dict[str,int])->List[List]:
     '''places ships with random coordinates and orientation on a board
 
-    Places ships with random coordinates and orientation on a board, checking if the placement is 
-    valid before placing the ship
+    Places ships with random coordinates and orientation on a board, choosing each ship's
+    placement uniformly from the placements that are still legal, so no try is ever wasted
+    on a placement that goes off the board or overlaps another ship
 
     Args:
         board : the board to place the battleships on
         battleships : the dictionary of battleships names and lengths to place on the board
     Returns:
         The board with the battleships placed on it
+    Raises:
+        ValueError: if the battleships cannot be placed on the board
+    '''
+    size = len(board)
+    if isinstance(board,BitBoard):
+        occupied = board.occupied
+    else:
+        occupied = BitBoard.from_board(board).occupied
+    chosen = sample_fleet_placements(random,size,list(battleships.values()),occupied)
+    for ship,placement_id in zip(battleships,chosen):
+        placement = placement_index(size,battleships[ship])[placement_id]
+        board = place_battleship_on_board(board,placement.x,placement.y,battleships[ship],
+                                          ship,orientation=placement.orientation)
+    return board
+
+
+def sample_fleet_placements(rng:random.Random,size:int,ship_lengths:List[int],
+                            occupied:int = 0)->List[int]:
+    '''chooses a random placement for each ship, from the placements that are still legal
+
+    Each ship first tries a few placements picked from the whole placement index, which are
+    uniform over the legal ones once the overlapping picks are thrown away, and if they all
+    overlap it picks from the filtered list of legal placements instead. If a ship has no legal
+    placement left the fleet is started again from the beginning.
+
+    Args:
+        rng : the random number generator to use, such as the random module or a random.Random
+        size : the width and height of the board
+        ship_lengths : the lengths of the ships to place, in order
+        occupied : the mask of cells that are already taken (default 0)
+    Returns:
+        The index into placement_index(size, length) of the placement of each ship
+    Raises:
+        ValueError: if the ships cannot be placed on the board
+    '''
+    for _ in range(MAX_FLEET_ATTEMPTS):
+        taken = occupied
+        chosen = []
+        for ship_length in ship_lengths:
+            placements = placement_index(size,ship_length)
+            placement_id = None
+            for _ in range(QUICK_PICKS):
+                if not placements:
+                    break
+                candidate = rng.randrange(len(placements))
+                if placements[candidate].mask & taken == 0:
+                    placement_id = candidate
+                    break
+            if placement_id is None:
+                legal = [i for i,p in enumerate(placements) if p.mask & taken == 0]
+                if not legal:
+                    break
+                placement_id = rng.choice(legal)
+            taken |= placements[placement_id].mask
+            chosen.append(placement_id)
+        else:
+            return chosen
+    raise ValueError('the battleships cannot be placed on the board')
+
+
+def generate_layouts(n:int,size:int,ships:Dict[str,int],seed:int = None)->array:
+    '''generates many independent random layouts of a fleet in one call
+
+    The layouts are stored compactly as an array of placement ids, with len(ships) entries
+    per layout in the order of the ships dictionary. Entry i*len(ships)+j is the index into
+    placement_index(size, length of ship j) of where ship j is placed in layout i, and
+    layout_to_board turns a layout back into a board.
+
+    Args:
+        n : the number of layouts to generate
+        size : the width and height of the board
+        ships : the dictionary of battleships names and lengths
+        seed : the seed for the random number generator, None for a random seed (default None)
+    Returns:
+        An array of n*len(ships) placement ids
     '''
+    rng = random.Random(seed)
+    ship_lengths = list(ships.values())
+    largest = max((len(placement_index(size,length)) for length in ship_lengths),default=0)
+    layouts = array('H' if largest <= 0xFFFF else 'I')
+    for _ in range(n):
+        layouts.extend(sample_fleet_placements(rng,size,ship_lengths))
+    return layouts
+
 
-    for ship in battleships:
-        placed = False
-        while not placed:
-
-            x = random.randint(0,len(board)-1)
-            y = random.randint(0,len(board)-1)
-            orientation = random.choice(['horizontal','vertical'])
-            if is_valid_placement(board,x,y,battleships[ship],orientation=orientation) is True:
-                board = place_battleship_on_board(board,x,y,battleships[ship],
-                                                    ship,orientation=orientation)
-                placed = True
+def layout_to_board(layouts:array,index:int,size:int,ships:Dict[str,int])->List[List]:
+    '''builds the board of one layout made by generate_layouts
+
+    Args:
+        layouts : the array returned by generate_layouts
+        index : which layout to build
+        size : the width and height of the board
+        ships : the dictionary of battleships names and lengths the layouts were made with
+    Returns:
+        The board (2D Array) with the battleships placed on it
+    '''
+    board = initialise_board(size)
+    offset = index*len(ships)
+    for i,ship in enumerate(ships):
+        for x,y in placement_index(size,ships[ship])[layouts[offset+i]].cells:
+            board[y][x] = ship
     return board
 
 
@@ -158,6 +355,10 @@ def simple_battleship_placement(board:List[List], battleships:Dict[str,int])->Li
     Returns:
         The board (2D Array) with the battleships placed on it
     '''
+    if isinstance(board,BitBoard):
+        for i,ship in enumerate(battleships):
+            board.place_battleship(0,i,battleships[ship],ship)
+        return board
     for i,ship in enumerate(battleships):
         size = len(board)
          #creates the name, for example "ship 2" for the length of ship 2
@@ -186,25 +387,24 @@ def is_valid_placement(board: List[List], x: int, y: int, ship_length: Dict[str,
     Returns:
         True if the ship can be placed, False if it cannot.
     '''
+    if isinstance(board,BitBoard):
+        return board.is_valid_placement(x,y,ship_length,orientation=orientation)
+    if orientation not in ('horizontal','vertical'):
+        raise ValueError('orientation must be "horizontal" or "vertical"')
+    if (x,y,orientation) not in placement_lookup(len(board),ship_length):
+        # the ship will go off the board
+        return False
     if orientation == 'horizontal':
-        if x + ship_length > len(board):
-            # the ship will go off the board
-            return False
         for i in range(ship_length):
             if board[y][x + i] is not None:
                 # there is already a ship in the way
                 return False
         return True
-    elif orientation == 'vertical':
-        # this adds to the row not col, but otherwise the same as above
-        if y + ship_length > len(board):
+    # this adds to the row not col, but otherwise the same as above
+    for i in range(ship_length):
+        if board[y + i][x] is not None:
             return False
-        for i in range(ship_length):
-            if board[y + i][x] is not None:
-                return False
-        return True
-    else:
-        raise ValueError('orientation must be "horizontal" or "vertical"')
+    return True
 
 
 def place_battleship_on_board(board:List[List],x:int,y:int,ship_length:int,
@@ -214,7 +414,7 @@ def place_battleship_on_board(board:List[List],x:int,y:int,ship_length:int,
     Place a battleship on the game board.
 
     Args:
-    - board (list): The game board represented as a 2D list.
+    - board (list): The game board represented as a 2D list, or a BitBoard.
     - x (int): The x-coordinate of the top-left corner of the battleship.
     - y (int): The y-coordinate of the top-left corner of the battleship.
     - ship_length (int): The length of the battleship.
@@ -228,6 +428,10 @@ def place_battleship_on_board(board:List[List],x:int,y:int,ship_length:int,
     - ValueError: If the orientation is neither 'horizontal' nor 'vertical'.
 
     '''
+    if isinstance(board,BitBoard):
+        if board.place_battleship(x,y,ship_length,ship_name,orientation=orientation):
+            return board
+        return -1
     if is_valid_placement(board,x,y,ship_length,orientation=orientation): #might need ==True
         if orientation == 'horizontal':
             for i in range(ship_length):
@@ -250,6 +454,8 @@ def print_board(board:List[List])->None:
     Returns:
         None
     '''
+    if isinstance(board,BitBoard):
+        board = board.to_board()
     longest = -1
     for row in board:
         for item in row:
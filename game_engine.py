@@ -13,7 +13,7 @@ Functions:
   Processes an attack on the board and updates the board and battleships dictionary accordingly.
   Args:
     - coords (list[int, int]): The coordinates of the attack.
-    - board (list[list]): The board to attack.
+    - board (list[list]): The board to attack, either a 2D list or a BitBoard.
     - battleships (dict[str, int]): The dictionary of battleships.
   Returns:
     - bool: True if the attack was successful, False if not.
@@ -26,7 +26,7 @@ Functions:
 - check_if_game_over(battleships: dict[str, int]) -> bool:
   Checks if the game is over by verifying if all battleship lengths are 0.
   Args:
-    - battleships (dict[str, int]): The dictionary of battleships.
+    - battleships (dict[str, int]): The dictionary of battleships, or a BitBoard.
   Returns:
     - bool: True if the game is over, False if not.
 
@@ -38,6 +38,7 @@ __main__:
 - Invokes the 'simple_game_loop()' function to start a single-player game loop.
 '''
 
+from bitboard import BitBoard
 from components import place_battleships,initialise_board,create_battleships
 
 players = {}
@@ -47,11 +48,17 @@ def attack(coords:list[int,int],board:list[list],battleships:dict[str,int])->boo
     and battleships dictionary accordingly
     Args:
         coords (list[int,int]): the coordinates of the attack
-        board (list[list]): the board to attack
+        board (list[list]): the board to attack, either a 2D list or a BitBoard
         battleships (dict[str,int]): the dictionary of battleships
     Returns:
         bool: True if the attack was successful, False if not
     '''
+    if isinstance(board,BitBoard):
+        ship_hit = board.attack(coords)
+        if ship_hit is None:
+            return False
+        battleships[ship_hit]-=1
+        return True
     content_of_square = board[coords[1]][coords[0]]
     if content_of_square is not None:
         battleships[content_of_square]-=1
@@ -75,10 +82,12 @@ def check_if_game_over(battleships):
     by checking if all battleship lengths are 0
 
     Args:
-        battleships (dict[str,int]): the dictionary of battleships
+        battleships (dict[str,int]): the dictionary of battleships, or a BitBoard
     Returns:
         bool: True if the game is over, False if not
     '''
+    if isinstance(battleships,BitBoard):
+        return battleships.is_game_over()
     for ship in battleships:
         if battleships[ship]>0:
             return False
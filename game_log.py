@@ -0,0 +1,286 @@
+'''
+Game Log Module
+
+This module records games as an append only binary log, so a game can be rebuilt after
+attack has taken the ship names off the board. Each game has one file, with a header naming
+the board size and fleet, then one fixed width record for every ship placed and every shot
+fired, holding the ship that was hit and if it was sunk. Writing a record opens the file,
+appends the record and closes it again, so no file is held open for a game between moves.
+
+Classes:
+- GameLog: Writes the log of a game, it only holds the name of its file, so it can be pickled
+  with the game it belongs to and appends to the same file in this process or another.
+- GameReplay: Reads a log and rebuilds the boards and ships of both players at any move.
+
+Functions:
+- logged_attack(game_log: GameLog, player: int, coords: tuple[int, int], board: list[list],
+                battleships: dict[str, int]) -> bool:
+  Processes an attack with game_engine.attack and writes it to the log.
+
+Usage:
+- To log a game and rebuild it after the tenth shot:
+    game_log = GameLog('game.log', 10, ships)
+    game_log.log_board(0, player_board)
+    game_log.log_board(1, ai_board)
+    logged_attack(game_log, 0, (3, 4), ai_board, ai_ships)
+    boards = GameReplay('game.log').state_at(10)
+
+File format:
+- A header of the magic bytes b'BSGL', the version, the board size and the number of ships,
+  then for each ship its length, the length of its name and its name in utf-8.
+- Then records of seven bytes: the kind (PLACEMENT or SHOT), the player, x, y, the number of
+  the ship (NO_SHIP for a miss), the length of the ship placed, and the flags
+  (VERTICAL for a placement, HIT and SUNK for a shot).
+'''
+
+import struct
+
+from bitboard import BitBoard, cell_bit
+from game_engine import attack
+
+LOG_MAGIC = b'BSGL'
+LOG_VERSION = 1
+HEADER = struct.Struct('<4sBBB')
+SHIP_HEADER = struct.Struct('<BB')
+RECORD = struct.Struct('<7B')
+
+# the kinds of record
+PLACEMENT = 0
+SHOT = 1
+
+# the flags of a record
+VERTICAL = 1
+HIT = 1
+SUNK = 2
+
+# the ship number of a shot that missed
+NO_SHIP = 0xFF
+
+# how many shots there are between the snapshots a replay keeps
+SNAPSHOT_INTERVAL = 16
+
+
+class GameLog:
+    '''
+    this class writes the log of a game, the players are numbered 0 and 1
+    and a shot is fired by one player at the board of the other
+    '''
+
+    def __init__(self,filename:str,size:int,ships:dict[str,int]):
+        '''
+        this function creates the log file and writes its header
+        Args:
+            filename (str): the file to write the log to
+            size (int): the size of the board
+            ships (dict): the dictionary of battleships names and lengths
+        '''
+        self.filename = filename
+        self.ship_numbers = {name:number for number,name in enumerate(ships)}
+        header = [HEADER.pack(LOG_MAGIC,LOG_VERSION,size,len(ships))]
+        for name,length in ships.items():
+            encoded = name.encode()
+            header.append(SHIP_HEADER.pack(length,len(encoded)))
+            header.append(encoded)
+        with open(filename,'wb') as f:
+            f.write(b''.join(header))
+
+    def append(self,data:bytes):
+        '''appends records to the end of the log, opening the file only for as long as it takes'''
+        with open(self.filename,'ab') as f:
+            f.write(data)
+
+    def write(self,*fields:int):
+        '''writes one record to the end of the log'''
+        self.append(RECORD.pack(*fields))
+
+    def placement_record(self,player:int,ship_name:str,x:int,y:int,ship_length:int,
+                         orientation:str = 'horizontal')->bytes:
+        '''returns the record of the placement of a ship, the arguments are as for log_placement'''
+        return RECORD.pack(PLACEMENT,player,x,y,self.ship_numbers[ship_name],ship_length,
+                           VERTICAL if orientation == 'vertical' else 0)
+
+    def log_placement(self,player:int,ship_name:str,x:int,y:int,ship_length:int,
+                      orientation:str = 'horizontal'):
+        '''
+        writes the placement of a ship
+        Args:
+            player (int): the player whose board the ship is on
+            ship_name (str): the name of the ship
+            x (int): the x coordinate of the start of the ship
+            y (int): the y coordinate of the start of the ship
+            ship_length (int): the length of the ship
+            orientation (str): the orientation of the ship (default 'horizontal')
+        '''
+        self.append(self.placement_record(player,ship_name,x,y,ship_length,orientation))
+
+    def log_board(self,player:int,board:list[list]):
+        '''
+        writes the placement of every ship on a board that has not been attacked yet
+        Args:
+            player (int): the player whose board it is
+            board (list[list]): the board, either a 2D list or a BitBoard
+        '''
+        if isinstance(board,BitBoard):
+            board = board.to_board()
+        cells = {}
+        for y,row in enumerate(board):
+            for x,name in enumerate(row):
+                if name is not None:
+                    cells.setdefault(name,[]).append((x,y))
+        records = []
+        for name,ship_cells in cells.items():
+            x,y = min(ship_cells)
+            orientation = 'vertical' if len(ship_cells) > 1 and ship_cells[1][0] == x else 'horizontal'
+            records.append(self.placement_record(player,name,x,y,len(ship_cells),orientation))
+        # the whole board is appended at once
+        self.append(b''.join(records))
+
+    def log_shot(self,player:int,coords:tuple[int,int],ship_name:str,sunk:bool):
+        '''
+        writes a shot and its outcome
+        Args:
+            player (int): the player who fired the shot
+            coords (tuple[int,int]): the coordinates of the shot
+            ship_name (str): the name of the ship that was hit, or None for a miss
+            sunk (bool): if the shot sank the ship
+        '''
+        if ship_name is None:
+            self.write(SHOT,player,coords[0],coords[1],NO_SHIP,0,0)
+        else:
+            self.write(SHOT,player,coords[0],coords[1],self.ship_numbers[ship_name],0,
+                       HIT | (SUNK if sunk else 0))
+
+
+def logged_attack(game_log:GameLog,player:int,coords:tuple[int,int],board:list[list],
+                  battleships:dict[str,int])->bool:
+    '''
+    processes an attack with game_engine.attack and writes it to the log,
+    the ship is read off the board first as attack removes it
+    Args:
+        game_log (GameLog): the log of the game, or None to only attack
+        player (int): the player making the attack
+        coords (tuple[int,int]): the coordinates of the attack
+        board (list[list]): the board to attack, either a 2D list or a BitBoard
+        battleships (dict[str,int]): the dictionary of battleships
+    Returns:
+        bool: True if the attack was successful, False if not
+    '''
+    if game_log is None:
+        return attack(coords,board,battleships)
+    if isinstance(board,BitBoard):
+        bit = cell_bit(coords[0],coords[1],board.size)
+        ship_name = next((name for name,mask in board.ships.items() if mask & bit),None)
+    else:
+        ship_name = board[coords[1]][coords[0]]
+    hit = attack(coords,board,battleships)
+    game_log.log_shot(player,coords,ship_name,hit and battleships[ship_name] == 0)
+    return hit
+
+
+class GameReplay:
+    '''
+    this class reads a game log and rebuilds the boards and ships of both players at any move,
+    it replays the log once and keeps a snapshot every snapshot_interval shots,
+    so a later seek only replays the shots after the nearest snapshot
+    '''
+
+    def __init__(self,filename:str,snapshot_interval:int = SNAPSHOT_INTERVAL):
+        '''
+        this function reads the log and takes the snapshots
+        Args:
+            filename (str): the file of the log
+            snapshot_interval (int): the number of shots between snapshots (default 16)
+        Raises:
+            ValueError: if the file is not a game log this version can read
+        '''
+        with open(filename,'rb') as f:
+            data = f.read()
+        magic,version,self.size,ship_count = HEADER.unpack_from(data)
+        if magic != LOG_MAGIC or version != LOG_VERSION:
+            raise ValueError(f'{filename} is not a version {LOG_VERSION} game log')
+        offset = HEADER.size
+        self.ships = {}
+        for _ in range(ship_count):
+            length,name_length = SHIP_HEADER.unpack_from(data,offset)
+            offset += SHIP_HEADER.size
+            self.ships[data[offset:offset+name_length].decode()] = length
+            offset += name_length
+        self.names = list(self.ships)
+        # a record that was only partly written when the game stopped is left out
+        end = offset + (len(data)-offset) // RECORD.size * RECORD.size
+        self.records = list(RECORD.iter_unpack(data[offset:end]))
+        # the position in records of each shot
+        self.shot_records = [i for i,record in enumerate(self.records) if record[0] == SHOT]
+        self.snapshot_interval = snapshot_interval
+        self.snapshots = []
+        state = {0:(BitBoard(self.size),{}),1:(BitBoard(self.size),{})}
+        position = 0
+        for move in range(0,len(self.shot_records)+1,snapshot_interval):
+            target = self.shot_records[move] if move < len(self.shot_records) else len(self.records)
+            self.apply(state,position,target)
+            position = target
+            self.snapshots.append((position,self.copy_state(state)))
+
+    def __len__(self)->int:
+        '''the number of shots in the log'''
+        return len(self.shot_records)
+
+    @staticmethod
+    def copy_state(state:dict)->dict:
+        '''returns a copy of the boards and ships of both players'''
+        copied = {}
+        for player,(board,ships) in state.items():
+            board_copy = BitBoard(board.size)
+            board_copy.ships = dict(board.ships)
+            board_copy.occupied = board.occupied
+            copied[player] = (board_copy,dict(ships))
+        return copied
+
+    def apply(self,state:dict,start:int,end:int):
+        '''
+        applies the records from start up to end to a state
+        Args:
+            state (dict): the board and ships of each player, which are changed
+            start (int): the position of the first record to apply
+            end (int): the position after the last record to apply
+        '''
+        for kind,player,x,y,ship,length,flags in self.records[start:end]:
+            if kind == PLACEMENT:
+                board,ships = state[player]
+                name = self.names[ship]
+                board.place_battleship(x,y,length,name,
+                                       'vertical' if flags & VERTICAL else 'horizontal')
+                ships[name] = length
+            else:
+                board,ships = state[1-player]
+                attack((x,y),board,ships)
+
+    def state_at(self,move:int)->dict[int,tuple[BitBoard,dict[str,int]]]:
+        '''
+        rebuilds the game before a move
+        Args:
+            move (int): the number of shots that have been fired, up to len(self)
+        Returns:
+            dict: the board, as a BitBoard, and the dictionary of ships left of each player
+        Raises:
+            IndexError: if move is not between 0 and the number of shots in the log
+        '''
+        if not 0 <= move <= len(self.shot_records):
+            raise IndexError(f'move must be between 0 and {len(self.shot_records)}')
+        position,snapshot = self.snapshots[move // self.snapshot_interval]
+        state = self.copy_state(snapshot)
+        end = self.shot_records[move] if move < len(self.shot_records) else len(self.records)
+        self.apply(state,position,end)
+        return state
+
+    def shots(self)->list[tuple[int,tuple[int,int],str,bool,bool]]:
+        '''
+        returns every shot in the log
+        Returns:
+            list: the player, coordinates, name of the ship hit or None, if it hit
+            and if it sank the ship, of each shot
+        '''
+        return [(player,(x,y),None if ship == NO_SHIP else self.names[ship],
+                 bool(flags & HIT),bool(flags & SUNK))
+                for kind,player,x,y,ship,length,flags in
+                (self.records[i] for i in self.shot_records)]
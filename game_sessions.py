@@ -0,0 +1,156 @@
+'''
+Game Sessions Module
+
+This module keeps the state of each game apart, so one server can host a game for every
+client at once. Each single player game has its own boards, ships, AI and log, and is looked up
+by the id of the client's session in a backend from state_backend.
+
+Classes:
+- SinglePlayerGame: The boards, ships, AI and log of one single player game.
+- GameStore: A dictionary of games that removes games left idle, finished games, and the least
+  recently used games past a cap, and counts them.
+
+Usage:
+- To start a game and attack the AI's board:
+    game = SinglePlayerGame(10, mainAI(10))
+    attack((x, y), game.AI_board, game.AI_ships)
+- To keep at most 1000 games, each for an hour after its last move:
+    store = GameStore(ttl=3600, max_games=1000)
+    store[gamecode] = {'joined': [playerid]}
+    store.finish(gamecode) # once the game has a winner
+'''
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable
+
+from components import create_battleships, initialise_board, place_battleships
+
+
+class SinglePlayerGame:
+    '''
+    this class holds one single player game, the player's board is empty
+    until the ships are placed and the AI's board is placed at random
+    '''
+
+    def __init__(self,size:int,ai,ai_board:list[list] = None):
+        '''
+        this function initialises the game
+        Args:
+            size (int): the size of the boards
+            ai (mainAI): the AI the player is playing against
+            ai_board (list[list]): the AI's board with the fleet from battleships.txt placed,
+            such as one from a LayoutPool (default None, the ships are placed at random)
+        '''
+        self.player_board = initialise_board(size)
+        self.player_ships = create_battleships()
+        self.AI_ships = create_battleships()
+        if ai_board is None:
+            ai_board = place_battleships(initialise_board(size),self.AI_ships,algorithm='random')
+        self.AI_board = ai_board
+        self.AI = ai
+        self.game_log = None # started when the player places their ships
+
+
+class GameStore:
+    '''
+    this class holds games by their code, ordered from the least to the most recently used,
+    a game is removed when it has been idle for longer than ttl seconds, when it finishes,
+    or when it is the least recently used game and there are more than max_games
+    '''
+
+    def __init__(self,ttl:float = 3600,max_games:int = 10000,on_remove:Callable = None,
+                 clock:Callable[[],float] = time.monotonic):
+        '''
+        this function initialises an empty store
+        Args:
+            ttl (float): the seconds a game can go without being used (default 3600)
+            max_games (int): the most games kept at once (default 10000)
+            on_remove (Callable): called with each game that is removed, to free what it holds
+            (default None)
+            clock (Callable): returns the time in seconds (default time.monotonic)
+        '''
+        self.ttl = ttl
+        self.max_games = max_games
+        self.on_remove = on_remove
+        self.clock = clock
+        # the game code to the game and the time it was last used
+        self.games = OrderedDict()
+        self.lock = threading.Lock()
+        self.evicted = 0
+        self.finished = 0
+
+    def __len__(self)->int:
+        '''the number of live games'''
+        return len(self.games)
+
+    def __contains__(self,gamecode:str)->bool:
+        '''if a game is live, this does not count as using it'''
+        with self.lock:
+            self.evict_expired()
+            return gamecode in self.games
+
+    def __getitem__(self,gamecode:str):
+        '''returns a game and marks it as used
+        Raises:
+            KeyError: if the game is not live'''
+        with self.lock:
+            self.evict_expired()
+            game,_ = self.games[gamecode]
+            self.games[gamecode] = (game,self.clock())
+            self.games.move_to_end(gamecode)
+            return game
+
+    def __setitem__(self,gamecode:str,game):
+        '''adds or replaces a game, evicting the least recently used games past max_games'''
+        with self.lock:
+            self.evict_expired()
+            self.games[gamecode] = (game,self.clock())
+            self.games.move_to_end(gamecode)
+            while len(self.games) > self.max_games:
+                self.remove_oldest()
+
+    def get(self,gamecode:str,default = None):
+        '''returns a game and marks it as used, or default if it is not live'''
+        try:
+            return self[gamecode]
+        except KeyError:
+            return default
+
+    def remove_oldest(self):
+        '''evicts the least recently used game, the lock must be held'''
+        _,(game,_) = self.games.popitem(last=False)
+        self.evicted += 1
+        if self.on_remove is not None:
+            self.on_remove(game)
+
+    def evict_expired(self):
+        '''
+        evicts the games that have been idle for longer than ttl, the lock must be held,
+        as the games are in the order they were used only the oldest need to be checked
+        '''
+        oldest_allowed = self.clock() - self.ttl
+        while self.games and next(iter(self.games.values()))[1] < oldest_allowed:
+            self.remove_oldest()
+
+    def finish(self,gamecode:str):
+        '''removes a game that has finished
+        Args:
+            gamecode (str): the code of the game'''
+        with self.lock:
+            entry = self.games.pop(gamecode,None)
+            if entry is None:
+                return
+            self.finished += 1
+        if self.on_remove is not None:
+            self.on_remove(entry[0])
+
+    def stats(self)->dict[str,int]:
+        '''returns the number of live games and the number evicted and finished so far
+        Returns:
+            dict: the counters as 'live', 'evicted' and 'finished'
+        '''
+        with self.lock:
+            self.evict_expired()
+            return {'live':len(self.games),'evicted':self.evicted,'finished':self.finished}
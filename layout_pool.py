@@ -0,0 +1,128 @@
+'''
+Layout Pool Module
+
+This module keeps boards with a fleet already placed at random, so starting a game takes a
+ready board instead of placing the ships while the player waits. There is a pool of boards for
+each board size and fleet, and when a pool runs low a background thread fills it back up with
+layouts from components.generate_layouts.
+
+Classes:
+- LayoutPool: The pools of ready boards, with their depth and the low water mark at which
+  they are filled.
+
+Usage:
+- To take a board for a new game, placing the ships on the spot only if the pool is empty:
+    pool = LayoutPool(depth=256, low_water=64)
+    pool.warm(10, create_battleships())
+    board = pool.take(10, create_battleships())
+'''
+
+import threading
+from collections import deque
+
+from components import generate_layouts, initialise_board, layout_to_board, place_battleships
+
+
+class LayoutPool:
+    '''
+    this class keeps a pool of ready boards for each board size and fleet, a pool is filled
+    up to depth boards by a background thread once it has fewer than low_water boards,
+    and counts the boards taken and the ones that had to be placed because the pool was empty
+    '''
+
+    def __init__(self,depth:int = 256,low_water:int = 64,batch:int = 64):
+        '''
+        this function initialises the pools, which are empty until they are warmed or taken from
+        Args:
+            depth (int): the number of boards a pool is filled up to (default 256)
+            low_water (int): the number of boards left in a pool below which it is filled
+            (default 64)
+            batch (int): the number of boards made at a time while filling a pool,
+            so a server serving from green threads is not held for long (default 64)
+        '''
+        self.depth = depth
+        self.low_water = low_water
+        self.batch = batch
+        # the size and ships of each fleet to its boards, and the fleets being filled
+        self.boards = {}
+        self.filling = set()
+        self.lock = threading.Lock()
+        self.taken = 0
+        self.misses = 0
+
+    @staticmethod
+    def fleet_key(size:int,ships:dict[str,int])->tuple:
+        '''returns the key of the pool of a board size and fleet'''
+        return (size,tuple(ships.items()))
+
+    def start_filling(self,size:int,ships:dict[str,int],key:tuple):
+        '''starts a thread to fill a pool, unless one already is, the lock must be held'''
+        if key in self.filling:
+            return
+        self.filling.add(key)
+        threading.Thread(target=self.fill,args=(size,dict(ships),key),daemon=True).start()
+
+    def fill(self,size:int,ships:dict[str,int],key:tuple):
+        '''
+        fills a pool up to depth boards, a batch at a time, this runs in the filling thread
+        Args:
+            size (int): the size of the boards
+            ships (dict): the dictionary of battleships names and lengths
+            key (tuple): the key of the pool
+        '''
+        try:
+            while True:
+                with self.lock:
+                    missing = self.depth-len(self.boards[key])
+                if missing <= 0:
+                    return
+                count = min(missing,self.batch)
+                layouts = generate_layouts(count,size,ships)
+                boards = [layout_to_board(layouts,i,size,ships) for i in range(count)]
+                with self.lock:
+                    self.boards[key].extend(boards)
+        finally:
+            with self.lock:
+                self.filling.discard(key)
+
+    def warm(self,size:int,ships:dict[str,int]):
+        '''
+        starts filling the pool of a board size and fleet, so the first games take ready boards
+        Args:
+            size (int): the size of the boards
+            ships (dict): the dictionary of battleships names and lengths
+        '''
+        key = self.fleet_key(size,ships)
+        with self.lock:
+            self.boards.setdefault(key,deque())
+            self.start_filling(size,ships,key)
+
+    def take(self,size:int,ships:dict[str,int])->list[list]:
+        '''
+        takes a ready board from the pool of a board size and fleet, the ships are placed on
+        the spot if the pool is empty, and the pool is filled if it is running low
+        Args:
+            size (int): the size of the board
+            ships (dict): the dictionary of battleships names and lengths
+        Returns:
+            list[list]: the board with the battleships placed on it, which no other game has
+        '''
+        key = self.fleet_key(size,ships)
+        with self.lock:
+            boards = self.boards.setdefault(key,deque())
+            board = boards.popleft() if boards else None
+            if len(boards) < self.low_water:
+                self.start_filling(size,ships,key)
+            self.taken += 1
+            if board is None:
+                self.misses += 1
+        if board is None:
+            board = place_battleships(initialise_board(size),dict(ships),algorithm='random')
+        return board
+
+    def stats(self)->dict[str,int]:
+        '''returns the boards ready in every pool, the boards taken so far,
+        and the number of them that were placed because their pool was empty'''
+        with self.lock:
+            ready = sum(len(boards) for boards in self.boards.values())
+        return {'ready':ready,'taken':self.taken,'misses':self.misses}
@@ -0,0 +1,166 @@
+'''
+Load Test Module
+
+This module measures how many multiplayer players one server can hold, and how many attacks
+it can serve, by connecting many Socket.IO clients and playing games against the server from
+one asyncio process. Each game has two sockets in the game's room and two players who keep
+attacking empty cells, so the games never end. Single player clients can play against the AI
+at the same time, each with its own session, attacking every cell in turn and starting a new
+game when one ends.
+
+Usage:
+- Start the server, for example with gevent on one core:
+    SOCKETIO_ASYNC_MODE=gevent taskset -c 0 gunicorn -k gevent -w 1 -b 127.0.0.1:8000 main:app
+- Then run this module, which needs aiohttp and python-socketio[asyncio_client]:
+    python loadtest.py --url http://127.0.0.1:8000 --games 200 --idle 2000 --seconds 30
+- To have single player clients play the AI alongside, thinking for a second between attacks:
+    python loadtest.py --games 50 --idle 0 --players 4 --think 1
+
+Functions:
+- run_load_test(url: str, games: int, idle: int, seconds: float, players: int = 0,
+  think: float = 0) -> dict:
+  Connects the sockets, plays the games for a number of seconds and returns the measurements.
+'''
+
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+
+import aiohttp
+import socketio
+
+from components import create_battleships
+
+
+async def connect_socket(url:str,gamecode:str,on_event=None)->socketio.AsyncClient:
+    '''connects a socket to the room of a game, over websocket only'''
+    client = socketio.AsyncClient(reconnection=False)
+    if on_event is not None:
+        client.on('attacksoc',on_event)
+    await client.connect(f'{url}?gamecode={gamecode}',transports=['websocket'])
+    return client
+
+
+async def play_game(session:aiohttp.ClientSession,url:str,stop:asyncio.Event,
+                    stats:dict,sockets:list):
+    '''
+    starts a game for two players and has them attack empty cells until stop is set,
+    the ships are placed on the top rows and the attacks are on the bottom rows
+    '''
+    gamecode = uuid.uuid4().hex
+
+    def on_event(_):
+        stats['events'] += 1
+
+    for _ in range(2):
+        sockets.append(await connect_socket(url,gamecode,on_event))
+    ships = {name:[0,row,'h'] for row,name in enumerate(create_battleships())}
+    for playerid in ('1','2'):
+        async with session.get(f'{url}/create_game',
+                               params={'gamecode':gamecode,'playerid':playerid}) as response:
+            await response.read()
+    for playerid in ('1','2'):
+        async with session.post(f'{url}/mpplacement',
+                                json=dict(ships,gamecode=gamecode,playerid=playerid)) as response:
+            await response.read()
+    cells = [(x,y) for y in range(5,10) for x in range(10)]
+    move = 0
+    while not stop.is_set():
+        x,y = cells[move % len(cells)]
+        start = time.perf_counter()
+        for playerid in ('1','2'):
+            async with session.post(f'{url}/mpattack',json={'gamecode':gamecode,
+                                                            'playerid':playerid,
+                                                            'x':x,'y':y}) as response:
+                await response.read()
+        stats['round_times'].append(time.perf_counter()-start)
+        move += 1
+
+
+async def play_single_player(url:str,stop:asyncio.Event,stats:dict,think:float):
+    '''
+    places the ships of a single player game and attacks every cell in turn until stop is set,
+    waiting for the AI's move on each attack and thinking for a number of seconds after it,
+    a new game is started when one ends, the client has its own session so its own game
+    '''
+    ships = {name:[0,row,'h'] for row,name in enumerate(create_battleships())}
+    cells = [(x,y) for y in range(10) for x in range(10)]
+    async with aiohttp.ClientSession() as session:
+        while not stop.is_set():
+            async with session.post(f'{url}/placement',json=ships) as response:
+                await response.read()
+            for x,y in cells:
+                if stop.is_set():
+                    return
+                start = time.perf_counter()
+                async with session.get(f'{url}/attack',params={'x':x,'y':y}) as response:
+                    result = await response.json()
+                stats['move_times'].append(time.perf_counter()-start)
+                if 'finished' in result:
+                    break
+                await asyncio.sleep(think)
+
+
+async def run_load_test(url:str,games:int,idle:int,seconds:float,players:int = 0,
+                        think:float = 0)->dict:
+    '''
+    connects the sockets, plays the games for a number of seconds and returns the measurements
+    Args:
+        url (str): the url of the server
+        games (int): the number of games played at once, each with two sockets
+        idle (int): the number of extra sockets that only wait in a room
+        seconds (float): how long the games are played for
+        players (int): the number of single player clients playing the AI at once (default 0)
+        think (float): the seconds a single player client waits between attacks (default 0)
+    Returns:
+        dict: the sockets connected, how long connecting them took, the rounds of two attacks
+        played per second with their median and 99th percentile time, the socket
+        events received per second, and the single player attacks answered with the AI's
+        move per second with their median and 99th percentile time
+    '''
+    stats = {'events':0,'round_times':[],'move_times':[]}
+    sockets = []
+    connect_start = time.perf_counter()
+    for start in range(0,idle,20):
+        sockets.extend(await asyncio.gather(*(connect_socket(url,f'idle-{i}')
+                                              for i in range(start,min(start+20,idle)))))
+    connect_time = time.perf_counter()-connect_start
+    stop = asyncio.Event()
+    connector = aiohttp.TCPConnector(limit=0)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        tasks = [asyncio.create_task(play_game(session,url,stop,stats,sockets))
+                 for _ in range(games)]
+        tasks.extend(asyncio.create_task(play_single_player(url,stop,stats,think))
+                     for _ in range(players))
+        await asyncio.sleep(seconds)
+        stop.set()
+        await asyncio.gather(*tasks)
+    for client in sockets:
+        await client.disconnect()
+    rounds = sorted(stats['round_times'])
+    moves = sorted(stats['move_times'])
+    return {'sockets':len(sockets),
+            'idle_connect_seconds':connect_time,
+            'rounds_per_second':len(rounds)/seconds,
+            'median_round_ms':statistics.median(rounds)*1000 if rounds else None,
+            'p99_round_ms':rounds[int(0.99*(len(rounds)-1))]*1000 if rounds else None,
+            'events_per_second':stats['events']/seconds,
+            'ai_moves_per_second':len(moves)/seconds,
+            'median_move_ms':statistics.median(moves)*1000 if moves else None,
+            'p99_move_ms':moves[int(0.99*(len(moves)-1))]*1000 if moves else None}
+
+
+if __name__=='__main__':
+    parser = argparse.ArgumentParser(description='Measure the multiplayer capacity of a server')
+    parser.add_argument('--url',default='http://127.0.0.1:8000',help='the url of the server')
+    parser.add_argument('--games',type=int,default=100,help='the games played at once')
+    parser.add_argument('--idle',type=int,default=1000,help='the extra sockets left waiting')
+    parser.add_argument('--seconds',type=float,default=20,help='how long to play for')
+    parser.add_argument('--players',type=int,default=0,help='the single player clients')
+    parser.add_argument('--think',type=float,default=0,
+                        help='the seconds a single player client waits between attacks')
+    args = parser.parse_args()
+    print(asyncio.run(run_load_test(args.url,args.games,args.idle,args.seconds,
+                                    args.players,args.think)))
@@ -30,9 +30,37 @@ communicates results to both players.
 
 Global Variables:
 - BOARD_SIZE: The size of the game board.
+- OPENING_BOOK: The AI's precomputed first moves, loaded from opening_book.bin if it exists.
+- GAME_LOG_DIR: The directory the binary log of each game is written to, see game_log.py,
+from the GAME_LOG_DIR environment variable, 'game_logs' by default.
+- STATE_BACKEND: Where the games are kept, from the GAME_STATE_BACKEND environment variable,
+'memory' (the default) or 'sqlite:///path' to share them between processes.
+- single_player_games: The single player game of each session, see game_sessions.py.
+- MP_GAME_TTL: The seconds a multiplayer game is kept without a move.
+- MAX_MP_GAMES: The most multiplayer games kept at once, past which the least recently
+used are removed.
+- AI_TIME_ALLOWED: The seconds the AI searches for its move.
+- LAYOUT_POOL: The AI's boards, placed ahead of time in the background, see layout_pool.py.
+- AI_POOL: The worker processes the AI's moves are chosen in, see ai_pool.py, their number is
+set by the AI_WORKERS environment variable.
+Both pools and the log directory are set up by start_background_work before the first request.
+- mp_games: The multiplayer games by their game code, in a backend from state_backend.py
+that removes finished, idle and excess games and counts them.
 
 Notes:
-- The server maintains game state using global variables and communicates updates via sockets.
+- The server keeps a single player game for each browser session, found by the id stored
+in the session cookie, and communicates multiplayer updates via sockets, each multiplayer
+page joining the Socket.IO room of its game code so events are only sent to that game.
+- The AI's moves are chosen in worker processes, so a request waiting on a move does not
+stop the server serving other requests, and if the workers are saturated or a move takes too
+long the AI plays the move with the best density count instead of searching. Each move is
+started as soon as the AI has registered its last shot, while the player thinks. When the
+green threads of the server are not monkey patched, as with python main.py, the wait for the
+move is done in a real thread by run_off_event_loop.
+- To hold many sockets, run the server with gevent as in the Procfile.
+- To run more than one worker, set GAME_STATE_BACKEND to a sqlite url so the workers share
+the games, SECRET_KEY so they all accept the same session cookies, and
+SOCKETIO_MESSAGE_QUEUE so socket events reach players connected to another worker.
 - For multiplayer functionality, the server supports the creation of game sessions 
 and handles ship placement and attacks for two players.
 
@@ -42,33 +70,144 @@ python main.py
 '''
 
 
-from flask import Flask, render_template,jsonify,request
-from flask_socketio import SocketIO
+import os
+import threading
+import uuid
+
+from flask import Flask, render_template,jsonify,request,session
+from flask_socketio import SocketIO, join_room
 
 from components import (
     create_battleships,
     initialise_board,
-    place_battleship_on_board,
-    place_battleships
+    place_battleship_on_board
 )
-from game_engine import attack,check_if_game_over
-
-from aiClass import mainAI
+from game_engine import check_if_game_over
+from game_log import GameLog, logged_attack
+from game_sessions import SinglePlayerGame
+from layout_pool import LayoutPool
+from state_backend import open_backend
+
+from aiClass import mainAI, shared_move_cache
+from ai_pool import AIPool
+from opening_book import load_opening_book
 app = Flask(__name__)
-socket = SocketIO(app)
+# signs the session cookie holding the id of each client's game
+app.secret_key = os.environ.get('SECRET_KEY') or os.urandom(32)
+# with more than one worker the socket events are passed between them through a message
+# queue, such as redis://, so a player gets the events sent from another worker,
+# and the async mode can be set to 'eventlet' or 'gevent' to serve every socket of a worker
+# from green threads, by default the best one installed is used
+socket = SocketIO(app,message_queue=os.environ.get('SOCKETIO_MESSAGE_QUEUE'),
+                  async_mode=os.environ.get('SOCKETIO_ASYNC_MODE'))
 
 
 BOARD_SIZE = 10
-AI = mainAI(BOARD_SIZE,time_allowed=2)
-player_board = initialise_board()
-player_ships = create_battleships()
+try:
+    OPENING_BOOK = load_opening_book('opening_book.bin')
+except FileNotFoundError:
+    # the AI searches every move if the book has not been built with opening_book.py
+    OPENING_BOOK = None
+GAME_LOG_DIR = os.environ.get('GAME_LOG_DIR','game_logs')
+STATE_BACKEND = os.environ.get('GAME_STATE_BACKEND','memory')
+AI_TIME_ALLOWED = 2
+# set by start_background_work before the first request is served
+AI_POOL = None
+LAYOUT_POOL = None
+background_lock = threading.Lock()
+
+
+def start_background_work():
+    '''
+    creates the directory of the game logs, the pool of worker processes the AI's moves are
+    chosen in and the pool of the AI's boards, which starts being filled, this is done before
+    the first request rather than when main is imported, so importing main starts nothing,
+    as when the tests import it or the AI's spawned workers import the server run as a script
+    '''
+    global AI_POOL,LAYOUT_POOL
+    with background_lock:
+        if AI_POOL is not None:
+            return
+        os.makedirs(GAME_LOG_DIR,exist_ok=True)
+        # the AI's boards are placed ahead of time, so starting a game takes a ready board
+        LAYOUT_POOL = LayoutPool()
+        LAYOUT_POOL.warm(BOARD_SIZE,create_battleships())
+        # the AI's moves are chosen in AI_WORKERS processes (by default one per CPU), a request
+        # waits a second longer than the AI searches for before choosing the move itself
+        AI_POOL = AIPool(workers=int(os.environ.get('AI_WORKERS',0)) or None,
+                         timeout=AI_TIME_ALLOWED+1)
+
+
+@app.before_request
+def start_background_work_once():
+    '''starts the background work when the first request comes in'''
+    if AI_POOL is None:
+        start_background_work()
+
+
+def new_single_player_game()->SinglePlayerGame:
+    '''creates a single player game against a new AI
+    Returns:
+        SinglePlayerGame: the game'''
+    return SinglePlayerGame(BOARD_SIZE,mainAI(BOARD_SIZE,time_allowed=AI_TIME_ALLOWED,
+                                              move_cache=shared_move_cache,
+                                              opening_book=OPENING_BOOK),
+                            ai_board=LAYOUT_POOL.take(BOARD_SIZE,create_battleships()))
+
 
-AI_board = initialise_board()
-AI_ships = create_battleships()
-AI_board = place_battleships(AI_board,AI_ships,algorithm='random')
+single_player_games = open_backend(STATE_BACKEND,'single_player')
 
-previous_attacks = [] # this is a list of coords the AI
-                      #has attacked to prevent it from attacking the same square twice
+
+def session_id()->str:
+    '''returns the id of the client's session, giving it one if it is new
+    Returns:
+        str: the session id'''
+    if 'game_id' not in session:
+        session['game_id'] = uuid.uuid4().hex
+    return session['game_id']
+
+
+def run_off_event_loop(function,*args):
+    '''
+    runs work that blocks, such as waiting on the AI's move, in a real thread when the server
+    serves its sockets from green threads that the blocking call would not yield to, which is
+    the case for gevent and eventlet unless threading has been monkey patched, as it is by the
+    gunicorn gevent worker but not by socket.run when main is run as a script
+    Args:
+        function (Callable): the work to run
+        args: the arguments to call it with
+    Returns:
+        the result of the function
+    '''
+    if socket.async_mode == 'gevent':
+        from gevent import monkey
+        if not monkey.is_module_patched('threading'):
+            import gevent
+            return gevent.get_hub().threadpool.apply(function,args)
+    elif socket.async_mode == 'eventlet':
+        from eventlet import patcher, tpool
+        if not patcher.is_monkey_patched('thread'):
+            return tpool.execute(function,*args)
+    return function(*args)
+
+
+def single_player_game()->SinglePlayerGame:
+    '''returns the single player game of the client's session, starting one if it has none
+    Returns:
+        SinglePlayerGame: the game'''
+    game = single_player_games.get(session_id())
+    if game is None:
+        game = new_single_player_game()
+        single_player_games.put(session_id(),game)
+    return game
+
+
+def new_game_log()->GameLog:
+    '''starts the log of a new game in GAME_LOG_DIR
+    Returns:
+        GameLog: the log, with the fleet from battleships.txt'''
+    return GameLog(os.path.join(GAME_LOG_DIR,f'{uuid.uuid4().hex}.log'),BOARD_SIZE,
+                   create_battleships())
 
 
 def parse_front_end_board(ship_data):
@@ -111,13 +250,20 @@ def placement_interface():
     if request.method == 'GET':
         return render_template('placement.html', ships=create_battleships(), board_size=BOARD_SIZE)
     else:
-        global player_board
         ship_data = request.get_json()
 
 
         print(ship_data)
         print(ship_data)
-        player_board = parse_front_end_board(ship_data)
+        # placing the ships starts a new game against a new AI
+        AI_POOL.discard(session_id())
+        game = new_single_player_game()
+        game.player_board = parse_front_end_board(ship_data)
+        # the player is 0 and the AI is 1 in the log
+        game.game_log = new_game_log()
+        game.game_log.log_board(0,game.player_board)
+        game.game_log.log_board(1,game.AI_board)
+        single_player_games.put(session_id(),game)
 
         return jsonify({'success': True})
 
@@ -131,16 +277,25 @@ def process_attack():
         and wether or not the game is over and if the players attack hit or missed
     """
     variables = list(request.args.values())
-    # print_board(AI_board)
+    # print_board(game.AI_board)
     x= int(variables[0])
     y= int(variables[1])
-    player_hit = attack((x,y),AI_board,AI_ships)
-
-    ai_x, ai_y = AI.new_next_move(player_ships)
-    ai_hit = attack((ai_x,ai_y),player_board,player_ships)
-    AI.register_shot((ai_x,ai_y),ai_hit)
-    player_win=check_if_game_over(AI_ships)
-    ai_win=check_if_game_over(player_ships)
+    # the requests of one session come one at a time, so the game is not locked while
+    # the AI chooses its move
+    game = single_player_game()
+    player_hit = logged_attack(game.game_log,0,(x,y),game.AI_board,game.AI_ships)
+
+    # the AI chooses its move in another process and is replaced by the AI that chose it
+    (ai_x, ai_y), game.AI = run_off_event_loop(AI_POOL.next_move,game.AI,game.player_ships,
+                                               session_id())
+    ai_hit = logged_attack(game.game_log,1,(ai_x,ai_y),game.player_board,game.player_ships)
+    game.AI.register_shot((ai_x,ai_y),ai_hit)
+    player_win=check_if_game_over(game.AI_ships)
+    ai_win=check_if_game_over(game.player_ships)
+    if not (player_win or ai_win):
+        # the AI's next move is chosen while the player thinks about their next attack
+        AI_POOL.speculate(session_id(),game.AI,game.player_ships)
+    single_player_games.put(session_id(),game)
     print(ai_win)
 
 
@@ -160,6 +315,7 @@ def root():
     Returns:
     - The rendered template 'main.html' with the specified parameters.
     """
+    player_board = single_player_game().player_board
     # Check if the player_board is empty
     board_empty = all(cell == '' for row in player_board for cell in row)
     if board_empty:
@@ -169,7 +325,19 @@ def root():
 
 # for multiplayer
 
-mp_games = {}
+MP_GAME_TTL = 3600
+MAX_MP_GAMES = 10000
+
+
+mp_games = open_backend(STATE_BACKEND,'multiplayer',ttl=MP_GAME_TTL,max_games=MAX_MP_GAMES)
+
+
+def game_not_found():
+    '''returns the response to a request for a multiplayer game that is not in mp_games,
+    because it has finished, been evicted or never existed
+    Returns:
+        tuple: the JSON error and the 404 status'''
+    return jsonify({'error':'game not found'}),404
 
 @app.route('/joinmultiplayer')
 def joinmultiplayer():
@@ -177,7 +345,11 @@ def joinmultiplayer():
     return render_template('joinmp.html')
 @socket.on("connect")
 def connect():
-    '''connects the socket, provides debug info that it works'''
+    '''connects the socket and joins the room of the game code the page connected with,
+    so the client is only sent the events of its own game, provides debug info that it works'''
+    gamecode = request.args.get('gamecode')
+    if gamecode:
+        join_room(gamecode)
     print('connected')
 
 
@@ -190,15 +362,21 @@ def create_game():
 
     gamecode = request.args.get('gamecode')
     playerid = request.args.get('playerid')
-    if gamecode not in mp_games:
-        mp_games[gamecode]={'joined':[playerid]}
+    with mp_games.update(gamecode,create=dict) as game:
+        first_player = 'joined' not in game
+        if first_player:
+            game['joined'] = [playerid]
+        else:
+            game['joined'].append(playerid)
+            # the players are numbered in the log by the order they joined
+            game['log'] = new_game_log()
+    if first_player:
         return render_template('waitingmp.html',gamecode=gamecode,playerid=playerid)
     else:
         #this is the sedcond player to join
         print('SENDING A PLAYER STRAIGHT TO MPPLACEMENT',gamecode,playerid)
         #tell the client who is waiting that the game can start now
-        socket.emit('game_start',{'room':gamecode})
-        mp_games[gamecode]['joined'].append(playerid)
+        socket.emit('game_start',{'room':gamecode},to=gamecode)
 
         return render_template('placementmp.html',gamecode=gamecode,
                                playerid=playerid,ships=create_battleships(), board_size=BOARD_SIZE)
@@ -221,12 +399,19 @@ def mpplacement():
         ship_data = data
         print(ship_data)
         print('MP gamecode bellow')
-        print(mp_games)
-        print(mp_games[gamecode])
+        print(gamecode)
 
         # adds all of the relevent data to the the game associated with that gamecode, and the
         # player associated with that id
-        mp_games[gamecode][playerid] = [parse_front_end_board(ship_data),create_battleships()]
+        try:
+            with mp_games.update(gamecode) as game:
+                print(game)
+                game[playerid] = [parse_front_end_board(ship_data),create_battleships()]
+                game['log'].log_board(game['joined'].index(playerid),game[playerid][0])
+        except KeyError:
+            if gamecode in mp_games:
+                raise
+            return game_not_found()
 
         return jsonify({'success':True}) # this is because the front end expects a response
 
@@ -235,9 +420,11 @@ def rendermpplay():
     '''renders the mpmain.html template'''
     gamecode = request.args.get('gamecode')
     playerid = request.args.get('playerid')
-    # could add a failure link page if this info doesnt checkout
+    game = mp_games.get(gamecode)
+    if game is None or playerid not in game:
+        return game_not_found()
     return render_template('mpmain.html',gamecode = gamecode,playerid = playerid,
-                           board_size=BOARD_SIZE,player_board=mp_games[gamecode][playerid][0])
+                           board_size=BOARD_SIZE,player_board=game[playerid][0])
 
 
 @app.route('/mpattack',methods=['POST'])
@@ -266,64 +453,86 @@ def mpattack():
     - AI_Turn (tuple[int,int], optional): The coordinates of the AI's attack.
     - ai_hit (bool, optional): Indicates whether the AI's attack was a hit.
     - finished (str, optional): Indicates whether the game is over and who won.
+    - error (str, optional): 'game not found', with a 404 status, if the game has finished
+    or has been removed.
 '''
     gamecode = request.get_json()['gamecode']
     playerid = request.get_json()['playerid']
     x = request.get_json()['x']
     y = request.get_json()['y']
 
-    opposition_playerid = [i for i in mp_games[gamecode]['joined'] if i!=playerid][0]
+    # the game is locked until both players' attacks are matched up
     try:
-        opp_board = mp_games[gamecode][opposition_playerid][0]
-        opp_ships = mp_games[gamecode][opposition_playerid][1]
+        with mp_games.update(gamecode) as game:
+            opposition_playerid = [i for i in game['joined'] if i!=playerid][0]
+            try:
+                opp_board = game[opposition_playerid][0]
+                opp_ships = game[opposition_playerid][1]
+            except KeyError:
+                return jsonify({'waiting':False,'msg':'opposition player hasn\'t placed ships yet'})
+
+            player_hit = logged_attack(game['log'],
+                                       game['joined'].index(playerid),(x,y),
+                                       opp_board,opp_ships)
+
+            return_dict_player_hit = {'hit':player_hit}
+            if 'hits' not in game:
+
+                #handles the first attack
+                game['hits'] = {}
+                game['hits'][playerid] = [x,y,player_hit]
+
+                return jsonify({'waiting':True}) # this is because both attacks
+                                                 # havent been registered with the server yet
+            game['hits'][playerid] = [x,y,player_hit]
+            print(game['hits'])
+            if len(game['hits'])==2:
+                print('adding more shit to the dicts')
+                #both players have attacked
+
+                #the "ai_turn" is just the term used by the frontend for the opposition move,
+                #so each player will have eachothers attack data here
+                return_dict_opposition_player_hit = {}
+                return_dict_opposition_player_hit['AI_Turn'] = game['hits'][playerid][:2]
+                return_dict_opposition_player_hit['ai_hit'] = game['hits'][playerid][2]
+                return_dict_opposition_player_hit['hit'] =game['hits'][opposition_playerid][2]
+                return_dict_opposition_player_hit['x'] = game['hits'][opposition_playerid][0]
+                return_dict_opposition_player_hit['y'] = game['hits'][opposition_playerid][1]
+
+                return_dict_player_hit['AI_Turn'] = game['hits'][opposition_playerid][:2]
+                return_dict_player_hit['ai_hit'] = game['hits'][opposition_playerid][2]
+                return_dict_player_hit['x'] = game['hits'][playerid][0]
+                return_dict_player_hit['y'] = game['hits'][playerid][1]
+
+
+
+            finished = False
+            if check_if_game_over(opp_ships):
+                return_dict_player_hit['finished']=f'Player {playerid} Wins!'
+                return_dict_opposition_player_hit['finished']=f'Player {playerid} Wins!'
+                finished = True
+            if check_if_game_over(game[playerid][1]):
+                return_dict_player_hit['finished']=f'Player {opposition_playerid} Wins!'
+                return_dict_opposition_player_hit['finished']=f'Player {opposition_playerid} Wins!'
+                finished = True
+            # the event is sent once the game is saved, so the backend is not held
+            # while the socket is written to
+            event = {playerid:return_dict_player_hit,
+                     opposition_playerid:return_dict_opposition_player_hit,'room':gamecode}
+            if not finished:
+                del game['hits'] # resets the state to no attacks registered
     except KeyError:
-        return jsonify({'waiting':False,'msg':'opposition player hasn\'t placed ships yet'})
-
-    player_hit = attack((x,y),opp_board,opp_ships)
-
-    return_dict_player_hit = {'hit':player_hit}
-    if 'hits' not in mp_games[gamecode]:
-
-        #handles the first attack
-        mp_games[gamecode]['hits'] = {}
-        mp_games[gamecode]['hits'][playerid] = [x,y,player_hit]
-
-        return jsonify({'waiting':True}) # this is because both attacks
-                                         # havent been registered with the server yet
-    mp_games[gamecode]['hits'][playerid] = [x,y,player_hit]
-    print(mp_games[gamecode]['hits'])
-    if len(mp_games[gamecode]['hits'])==2:
-        print('adding more shit to the dicts')
-        #both players have attacked
-
-        #the "ai_turn" is just the term used by the frontend for the opposition move,
-        #so each player will have eachothers attack data here
-        return_dict_opposition_player_hit = {}
-        return_dict_opposition_player_hit['AI_Turn'] = mp_games[gamecode]['hits'][playerid][:2]
-        return_dict_opposition_player_hit['ai_hit'] = mp_games[gamecode]['hits'][playerid][2]
-        return_dict_opposition_player_hit['hit'] =mp_games[gamecode]['hits'][opposition_playerid][2]
-        return_dict_opposition_player_hit['x'] = mp_games[gamecode]['hits'][opposition_playerid][0]
-        return_dict_opposition_player_hit['y'] = mp_games[gamecode]['hits'][opposition_playerid][1]
-
-        return_dict_player_hit['AI_Turn'] = mp_games[gamecode]['hits'][opposition_playerid][:2]
-        return_dict_player_hit['ai_hit'] = mp_games[gamecode]['hits'][opposition_playerid][2]
-        return_dict_player_hit['x'] = mp_games[gamecode]['hits'][playerid][0]
-        return_dict_player_hit['y'] = mp_games[gamecode]['hits'][playerid][1]
-
-
-
-    if check_if_game_over(opp_ships):
-        return_dict_player_hit['finished']=f'Player {playerid} Wins!'
-        return_dict_opposition_player_hit['finished']=f'Player {playerid} Wins!'
-    if check_if_game_over(mp_games[gamecode][playerid][1]):
-        return_dict_player_hit['finished']=f'Player {opposition_playerid} Wins!'
-        return_dict_opposition_player_hit['finished']=f'Player {opposition_playerid} Wins!'
+        if gamecode in mp_games:
+            raise
+        # the game finished or was evicted since the attack was sent
+        return game_not_found()
     print('emmitting socket')
     print({playerid:return_dict_player_hit})
     # emitting this socket message tells the frontend to render the new data
-    socket.emit('attacksoc',{playerid:return_dict_player_hit,
-                             opposition_playerid:return_dict_opposition_player_hit,'room':gamecode})
-    del mp_games[gamecode]['hits'] # resets the state to no attacks registered
+    socket.emit('attacksoc',event,to=gamecode)
+    if finished:
+        # nothing more is asked of a game once it has a winner
+        mp_games.finish(gamecode)
     return jsonify({'waiting':False})
 
 if __name__=='__main__':
@@ -0,0 +1,158 @@
+'''
+Opening Book Module
+
+This module precomputes the AI's first moves for a board size and fleet, and stores them in a
+compact binary file that the AI loads at startup. With no hits the AI's search only depends on
+its misses, and the book follows the line where every shot misses, since the first hit moves
+the AI to searching around it and leaves the book. Each move is searched with far more sampled
+layouts than the AI can afford during a game.
+
+Usage:
+- Run this module to build the book for the board size and fleet in battleships.txt:
+    python opening_book.py --size 10 --depth 12 --output opening_book.bin
+
+Classes:
+- OpeningBook: The moves of a book, with the board size and ship lengths they were built for.
+
+Functions:
+- build_opening_book(size: int, fleet: dict[str, int], depth: int, samples: int, seed: int)
+  -> list[tuple[int, int]]:
+  Searches the first depth moves of a game where every shot misses.
+
+- save_opening_book(filename: str, book: OpeningBook) -> None:
+  Writes a book to a file.
+
+- load_opening_book(filename: str) -> OpeningBook:
+  Reads a book from a file.
+
+File format:
+- A header of the magic bytes b'BSOB', the version, the board size, the number of moves and
+  the number of ships, then one byte per ship length (sorted), then two bytes per move holding
+  the cell number y*size+x, all little endian.
+'''
+
+import argparse
+import struct
+import time
+
+from aiClass import mainAI
+from components import create_battleships
+
+BOOK_MAGIC = b'BSOB'
+BOOK_VERSION = 1
+HEADER = struct.Struct('<4sBHHB')
+
+
+class OpeningBook:
+    '''
+    this class holds the moves of an opening book, and the board size and ship lengths
+    they were built for
+    '''
+
+    def __init__(self,size:int,ship_lengths:list[int],moves:list[tuple[int,int]]):
+        '''
+        this function initialises the book
+        Args:
+            size (int): the size of the board
+            ship_lengths (list): the length of each ship in the fleet
+            moves (list): the moves in the order they are played
+        '''
+        self.size = size
+        self.ship_lengths = tuple(sorted(ship_lengths))
+        self.moves = list(moves)
+
+    def move_for(self,size:int,fleet:dict[str,int],hits:list[tuple[int,int]],
+                 misses:list[tuple[int,int]])->tuple[int,int]:
+        '''
+        returns the book move for a state, if the game is still in the book
+        Args:
+            size (int): the size of the board
+            fleet (dict): the full length of each ship
+            hits (list): the coordinates that have been hit
+            misses (list): the coordinates that have been missed
+        Returns:
+            tuple[int,int]: the next move, or None if the state is not in the book
+        '''
+        played = len(misses)
+        if (hits or played >= len(self.moves) or size != self.size
+                or tuple(sorted(fleet.values())) != self.ship_lengths):
+            return None
+        if set(misses) != set(self.moves[:played]):
+            return None
+        return self.moves[played]
+
+
+def build_opening_book(size:int,fleet:dict[str,int],depth:int,samples:int = 50000,
+                       seed:int = 0)->list[tuple[int,int]]:
+    '''
+    searches the first moves of a game where every shot misses
+    Args:
+        size (int): the size of the board
+        fleet (dict): the length of each ship
+        depth (int): the number of moves to search
+        samples (int): the number of layouts sampled for each move (default 50000)
+        seed (int): the seed for the random number generator (default 0)
+    Returns:
+        list[tuple[int,int]]: the moves in the order they are played
+    '''
+    ai = mainAI(size,time_allowed=0,samples=samples,seed=seed)
+    ai.fleet = dict(fleet)
+    ai.ships = dict(fleet)
+    moves = []
+    for _ in range(depth):
+        # the deadline is far enough away that every sample is drawn
+        move = ai.search(deadline=time.time()+3600)
+        moves.append(move)
+        ai.register_shot(move,False)
+    return moves
+
+
+def save_opening_book(filename:str,book:OpeningBook)->None:
+    '''
+    writes a book to a file
+    Args:
+        filename (str): the file to write to
+        book (OpeningBook): the book to write
+    '''
+    with open(filename,'wb') as f:
+        f.write(HEADER.pack(BOOK_MAGIC,BOOK_VERSION,book.size,len(book.moves),
+                            len(book.ship_lengths)))
+        f.write(bytes(book.ship_lengths))
+        f.write(struct.pack(f'<{len(book.moves)}H',*(y*book.size+x for x,y in book.moves)))
+
+
+def load_opening_book(filename:str)->OpeningBook:
+    '''
+    reads a book from a file
+    Args:
+        filename (str): the file to read from
+    Returns:
+        OpeningBook: the book
+    Raises:
+        ValueError: if the file is not an opening book this version can read
+    '''
+    with open(filename,'rb') as f:
+        data = f.read()
+    magic,version,size,depth,ship_count = HEADER.unpack_from(data)
+    if magic != BOOK_MAGIC or version != BOOK_VERSION:
+        raise ValueError(f'{filename} is not a version {BOOK_VERSION} opening book')
+    offset = HEADER.size
+    ship_lengths = list(data[offset:offset+ship_count])
+    cells = struct.unpack_from(f'<{depth}H',data,offset+ship_count)
+    return OpeningBook(size,ship_lengths,[(cell % size,cell // size) for cell in cells])
+
+
+if __name__=='__main__':
+    parser = argparse.ArgumentParser(description='Build an opening book for the AI')
+    parser.add_argument('--size',type=int,default=10,help='the size of the board')
+    parser.add_argument('--depth',type=int,default=12,help='the number of moves to search')
+    parser.add_argument('--samples',type=int,default=50000,
+                        help='the number of layouts sampled for each move')
+    parser.add_argument('--ships',default='battleships.txt',help='the file to read the fleet from')
+    parser.add_argument('--output',default='opening_book.bin',help='the file to write the book to')
+    args = parser.parse_args()
+
+    ships = create_battleships(args.ships)
+    opening_moves = build_opening_book(args.size,ships,args.depth,samples=args.samples)
+    save_opening_book(args.output,OpeningBook(args.size,list(ships.values()),opening_moves))
+    print('OPENING MOVES: ',opening_moves)
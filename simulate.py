@@ -0,0 +1,459 @@
+'''
+Simulation Module
+
+This module plays complete games of battleships without any input, so changes to the AI can be
+measured over many games. Each game places a fleet at random, lets a strategy fire at it until
+every ship is sunk, and records the number of shots it took and how long each move took to
+choose. The games are shared out over a process pool, and every game has its own seed drawn
+from the seed of the run, so a run gives the same layouts for every strategy and every number of
+workers.
+
+Usage:
+- Run this module to compare the strategies over many games:
+    python simulate.py --strategies ai random neat --games 10000 --workers 8
+
+Strategies:
+- 'ai': the mainAI from aiClass.
+- 'random': the random attacks of generate_attack from mp_game_engine.
+- 'neat': the fittest genome in population.pickle.
+
+Classes:
+- RandomPlayer: Fires with generate_attack.
+- MainAIPlayer: Fires with a mainAI.
+- NeatPlayer: Fires at the unshot cell with the highest output of a NEAT genome.
+- SimulationResult: The shots to win and move times of every game a strategy played.
+
+Functions:
+- load_neat_genome(filename: str) -> object:
+  Loads the fittest genome of a pickled NEAT population.
+
+- game_seeds(seed: int, games: int) -> list[int]:
+  Returns the seed of each game of a run.
+
+- play_game(strategy: str, size: int, fleet: dict[str, int], seed: int,
+            options: dict) -> tuple[int, list[float]]:
+  Plays one game and returns the shots it took and the time of each move.
+
+- simulate(strategy: str, games: int, size: int, fleet: dict[str, int], seed: int,
+           workers: int, chunksize: int, options: dict) -> SimulationResult:
+  Plays many games of a strategy over a process pool.
+
+Notes:
+- The AI searches until its deadline, so unless time_allowed is long enough for every sample
+  to be drawn its moves also depend on the speed of the machine.
+'''
+
+import argparse
+import math
+import os
+import pickle
+import random
+import statistics
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+from aiClass import mainAI
+from bitboard import BitBoard, placement_index
+from components import create_battleships, sample_fleet_placements
+from game_engine import attack, check_if_game_over
+from mp_game_engine import generate_attack
+from opening_book import load_opening_book
+
+# the node types used by the NEAT population
+INPUT_NODE = 0
+HIDDEN_NODE = 1
+OUTPUT_NODE = 2
+
+# the inputs given to the NEAT genome for each cell of the board
+HIT_INPUT = 1.0
+MISS_INPUT = -1.0
+UNKNOWN_INPUT = 0.0
+
+
+class RandomPlayer:
+    '''
+    this class fires at random cells that have not been fired at, with generate_attack
+    '''
+
+    def __init__(self,size:int,fleet:dict[str,int],seed:int,options:dict):
+        '''
+        this function initialises the player
+        Args:
+            size (int): the size of the board
+            fleet (dict): the length of each ship
+            seed (int): the seed for the game
+            options (dict): the options of the run, which are not used
+        '''
+        self.size = size
+        self.previous_attacks = []
+        # generate_attack uses the random module, which is safe to seed as games in the
+        # same process are played one after the other
+        random.seed(seed)
+
+    def next_move(self,ships:dict[str,int])->tuple[int,int]:
+        '''returns the next cell to fire at
+        Args:
+            ships (dict): the cells left of each ship
+        Returns:
+            tuple[int,int]: the coordinates of the attack'''
+        return generate_attack(self.previous_attacks,self.size)
+
+    def register_shot(self,coord:tuple[int,int],hit:bool):
+        '''generate_attack keeps its own list of the previous attacks'''
+
+
+class MainAIPlayer:
+    '''
+    this class fires with a mainAI
+    '''
+
+    def __init__(self,size:int,fleet:dict[str,int],seed:int,options:dict):
+        '''
+        this function initialises the player
+        Args:
+            size (int): the size of the board
+            fleet (dict): the length of each ship
+            seed (int): the seed for the AI
+            options (dict): the time_allowed, samples and opening_book of the AI
+        '''
+        book = None
+        if options.get('opening_book'):
+            book = cached_opening_book(options['opening_book'])
+        self.ai = mainAI(size,time_allowed=options.get('time_allowed',0.1),
+                         samples=options.get('samples',200),seed=seed,opening_book=book)
+        self.ai.fleet = dict(fleet)
+        self.ai.ships = dict(fleet)
+
+    def next_move(self,ships:dict[str,int])->tuple[int,int]:
+        '''returns the next cell to fire at
+        Args:
+            ships (dict): the cells left of each ship
+        Returns:
+            tuple[int,int]: the coordinates of the attack'''
+        # the AI keeps the dictionary it is given, so it gets its own copy
+        return self.ai.new_next_move(dict(ships))
+
+    def register_shot(self,coord:tuple[int,int],hit:bool):
+        '''tells the AI if its last move was a hit'''
+        self.ai.register_shot(coord,hit)
+
+
+class NeatPlayer:
+    '''
+    this class fires at the cell with the highest output of a NEAT genome, out of the cells
+    it has not fired at, the board is given as one input per cell of
+    HIT_INPUT, MISS_INPUT or UNKNOWN_INPUT
+    '''
+
+    def __init__(self,size:int,fleet:dict[str,int],seed:int,options:dict):
+        '''
+        this function initialises the player
+        Args:
+            size (int): the size of the board
+            fleet (dict): the length of each ship
+            seed (int): the seed used to choose between cells with the same output
+            options (dict): the population file of the genome, as 'population'
+        Raises:
+            ValueError: if the genome does not have one input and one output per cell
+        '''
+        genome = load_neat_genome(options.get('population','population.pickle'))
+        self.inputs = sorted(i for i,node in genome.node_genes.items() if node.type == INPUT_NODE)
+        self.outputs = sorted(i for i,node in genome.node_genes.items()
+                              if node.type == OUTPUT_NODE)
+        if len(self.inputs) != size*size or len(self.outputs) != size*size:
+            raise ValueError(f'the genome does not have {size*size} inputs and outputs')
+        self.incoming = {}
+        for connection in genome.connection_genes.values():
+            if connection.enabled:
+                self.incoming.setdefault(connection.out_node,[]).append(
+                    (connection.in_node,connection.weight))
+        self.size = size
+        self.rng = random.Random(seed)
+        self.values = {node:UNKNOWN_INPUT for node in self.inputs}
+
+    def node_value(self,node,memo:dict,visiting:set)->float:
+        '''
+        returns the weighted sum into a node, a connection that loops back
+        to a node already being worked out adds nothing
+        Args:
+            node: the id of the node
+            memo (dict): the values worked out so far for this move
+            visiting (set): the nodes being worked out
+        Returns:
+            float: the value of the node
+        '''
+        if node in memo:
+            return memo[node]
+        visiting.add(node)
+        total = self.values.get(node,0.0)
+        for in_node,weight in self.incoming.get(node,()):
+            if in_node not in visiting:
+                total += weight*self.node_value(in_node,memo,visiting)
+        visiting.discard(node)
+        memo[node] = total
+        return total
+
+    def next_move(self,ships:dict[str,int])->tuple[int,int]:
+        '''returns the unshot cell with the highest output, choosing at random between ties
+        Args:
+            ships (dict): the cells left of each ship
+        Returns:
+            tuple[int,int]: the coordinates of the attack'''
+        memo = {}
+        best = -math.inf
+        best_cells = []
+        for cell,node in enumerate(self.outputs):
+            if self.values[self.inputs[cell]] != UNKNOWN_INPUT:
+                continue
+            value = self.node_value(node,memo,set())
+            if value > best:
+                best = value
+                best_cells = [cell]
+            elif value == best:
+                best_cells.append(cell)
+        cell = self.rng.choice(best_cells)
+        return (cell % self.size,cell // self.size)
+
+    def register_shot(self,coord:tuple[int,int],hit:bool):
+        '''sets the input of the cell to a hit or a miss'''
+        self.values[self.inputs[coord[1]*self.size+coord[0]]] = HIT_INPUT if hit else MISS_INPUT
+
+
+STRATEGIES = {'ai':MainAIPlayer,'random':RandomPlayer,'neat':NeatPlayer}
+
+
+class _NeatUnpickler(pickle.Unpickler):
+    '''
+    the NEAT population was pickled from the script that trained it, so its classes are
+    looked up in __main__, this gives each of them an empty class to load its attributes into
+    '''
+    classes = {}
+
+    def find_class(self,module,name):
+        if module == '__main__':
+            return self.classes.setdefault(name,type(name,(),{}))
+        return super().find_class(module,name)
+
+
+@lru_cache(maxsize=None)
+def load_neat_genome(filename:str = 'population.pickle'):
+    '''
+    loads the fittest genome of a pickled NEAT population, once per process
+    Args:
+        filename (str): the file of the population (default 'population.pickle')
+    Returns:
+        the genome, with node_genes and connection_genes dictionaries
+    '''
+    with open(filename,'rb') as f:
+        population = _NeatUnpickler(f).load()
+    return max(population.population,key=lambda genome:genome.fitness)
+
+
+@lru_cache(maxsize=None)
+def cached_opening_book(filename:str):
+    '''loads an opening book once per process
+    Args:
+        filename (str): the file of the book
+    Returns:
+        OpeningBook: the book'''
+    return load_opening_book(filename)
+
+
+def game_seeds(seed:int,games:int)->list[int]:
+    '''
+    returns the seed of each game of a run, so game i is the same in every run with the same seed
+    Args:
+        seed (int): the seed of the run
+        games (int): the number of games
+    Returns:
+        list[int]: the seed of each game
+    '''
+    rng = random.Random(seed)
+    return [rng.getrandbits(64) for _ in range(games)]
+
+
+def random_fleet_board(size:int,fleet:dict[str,int],rng:random.Random)->BitBoard:
+    '''
+    places a fleet at random on a BitBoard
+    Args:
+        size (int): the size of the board
+        fleet (dict): the length of each ship
+        rng (random.Random): the random number generator to use
+    Returns:
+        BitBoard: the board with every ship placed
+    '''
+    board = BitBoard(size)
+    ship_ids = sample_fleet_placements(rng,size,list(fleet.values()))
+    for (name,length),placement_id in zip(fleet.items(),ship_ids):
+        mask = placement_index(size,length)[placement_id].mask
+        board.ships[name] = mask
+        board.occupied |= mask
+    return board
+
+
+def play_game(strategy:str,size:int,fleet:dict[str,int],seed:int,
+              options:dict = None)->tuple[int,list[float]]:
+    '''
+    plays one game of a strategy against a random layout
+    Args:
+        strategy (str): the name of the strategy in STRATEGIES
+        size (int): the size of the board
+        fleet (dict): the length of each ship
+        seed (int): the seed of the game, which chooses the layout and seeds the player
+        options (dict): the options given to the player (default None)
+    Returns:
+        tuple[int,list[float]]: the shots it took to sink every ship, and the time in seconds
+        the player took to choose each move
+    Raises:
+        RuntimeError: if the player has not won after firing twice at every cell
+    '''
+    rng = random.Random(seed)
+    board = random_fleet_board(size,fleet,rng)
+    ships = dict(fleet)
+    player = STRATEGIES[strategy](size,fleet,rng.getrandbits(64),options or {})
+    latencies = []
+    while check_if_game_over(ships) is False:
+        if len(latencies) >= 2*size*size:
+            raise RuntimeError(f'{strategy} did not win within {2*size*size} shots')
+        start = time.perf_counter()
+        coord = player.next_move(ships)
+        latencies.append(time.perf_counter()-start)
+        player.register_shot(coord,attack(coord,board,ships))
+    return len(latencies),latencies
+
+
+def _play_games(strategy:str,size:int,fleet:dict[str,int],seeds:list[int],
+                options:dict)->tuple[array,array]:
+    '''plays a chunk of games in a worker, returning the shots and move times as arrays'''
+    shots = array('H')
+    latencies = array('d')
+    for seed in seeds:
+        game_shots,game_latencies = play_game(strategy,size,fleet,seed,options)
+        shots.append(game_shots)
+        latencies.extend(game_latencies)
+    return shots,latencies
+
+
+class SimulationResult:
+    '''
+    this class holds the shots to win and move times of every game a strategy played
+    '''
+
+    def __init__(self,strategy:str,shots:array,latencies:array):
+        '''
+        this function initialises the result
+        Args:
+            strategy (str): the name of the strategy
+            shots (array): the shots to win of each game, in the order of the seeds
+            latencies (array): the time in seconds of every move of every game
+        '''
+        self.strategy = strategy
+        self.shots = shots
+        self.latencies = latencies
+
+    def summary(self)->dict[str,float]:
+        '''
+        returns the statistics of the shots to win and the move times
+        Returns:
+            dict: the games, mean, median, stdev, min and max shots to win, and the mean,
+            median, 95th and 99th percentile and max move time in seconds
+        '''
+        latencies = sorted(self.latencies)
+
+        def percentile(fraction):
+            return latencies[min(len(latencies)-1,int(fraction*len(latencies)))]
+
+        return {'games':len(self.shots),
+                'mean_shots':statistics.fmean(self.shots),
+                'median_shots':statistics.median(self.shots),
+                'stdev_shots':statistics.pstdev(self.shots),
+                'min_shots':min(self.shots),
+                'max_shots':max(self.shots),
+                'mean_latency':statistics.fmean(latencies),
+                'p50_latency':percentile(0.5),
+                'p95_latency':percentile(0.95),
+                'p99_latency':percentile(0.99),
+                'max_latency':latencies[-1]}
+
+
+def simulate(strategy:str,games:int,size:int = 10,fleet:dict[str,int] = None,seed:int = 0,
+             workers:int = None,chunksize:int = 50,options:dict = None)->SimulationResult:
+    '''
+    plays many games of a strategy, shared out over a process pool
+    Args:
+        strategy (str): the name of the strategy in STRATEGIES
+        games (int): the number of games to play
+        size (int): the size of the board (default 10)
+        fleet (dict): the length of each ship (default None, the fleet in battleships.txt)
+        seed (int): the seed of the run (default 0)
+        workers (int): the number of processes, 1 plays every game in this process
+        (default None, one per CPU)
+        chunksize (int): the number of games given to a process at a time (default 50)
+        options (dict): the options given to each player (default None)
+    Returns:
+        SimulationResult: the shots to win and move times of every game
+    Raises:
+        ValueError: if the strategy is not in STRATEGIES
+    '''
+    if strategy not in STRATEGIES:
+        raise ValueError(f'strategy must be one of {", ".join(STRATEGIES)}')
+    if fleet is None:
+        fleet = create_battleships()
+    options = options or {}
+    seeds = game_seeds(seed,games)
+    chunks = [seeds[i:i+chunksize] for i in range(0,games,chunksize)]
+    shots = array('H')
+    latencies = array('d')
+    if workers == 1:
+        results = (_play_games(strategy,size,fleet,chunk,options) for chunk in chunks)
+        for chunk_shots,chunk_latencies in results:
+            shots.extend(chunk_shots)
+            latencies.extend(chunk_latencies)
+        return SimulationResult(strategy,shots,latencies)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # map gives the chunks back in order, so the shots line up with the seeds
+        results = executor.map(_play_games,*zip(*((strategy,size,fleet,chunk,options)
+                                                   for chunk in chunks)))
+        for chunk_shots,chunk_latencies in results:
+            shots.extend(chunk_shots)
+            latencies.extend(chunk_latencies)
+    return SimulationResult(strategy,shots,latencies)
+
+
+if __name__=='__main__':
+    parser = argparse.ArgumentParser(description='Play many games of battleships without input')
+    parser.add_argument('--strategies',nargs='+',default=['ai','random'],choices=list(STRATEGIES),
+                        help='the strategies to play')
+    parser.add_argument('--games',type=int,default=1000,help='the number of games per strategy')
+    parser.add_argument('--size',type=int,default=10,help='the size of the board')
+    parser.add_argument('--seed',type=int,default=0,help='the seed of the run')
+    parser.add_argument('--workers',type=int,default=os.cpu_count(),
+                        help='the number of processes to play the games in')
+    parser.add_argument('--chunksize',type=int,default=50,
+                        help='the number of games given to a process at a time')
+    parser.add_argument('--ships',default='battleships.txt',help='the file to read the fleet from')
+    parser.add_argument('--time-allowed',type=float,default=0.1,
+                        help='the time the AI has to choose each move')
+    parser.add_argument('--samples',type=int,default=200,
+                        help='the most layouts the AI samples for each move')
+    parser.add_argument('--opening-book',default=None,help='the opening book file for the AI')
+    parser.add_argument('--population',default='population.pickle',
+                        help='the NEAT population file')
+    args = parser.parse_args()
+
+    run_options = {'time_allowed':args.time_allowed,'samples':args.samples,
+                   'opening_book':args.opening_book,'population':args.population}
+    ship_data = create_battleships(args.ships)
+    for name in args.strategies:
+        run_start = time.time()
+        stats = simulate(name,args.games,size=args.size,fleet=ship_data,seed=args.seed,
+                         workers=args.workers,chunksize=args.chunksize,options=run_options).summary()
+        print(f'{name}: {stats["games"]} games in {time.time()-run_start:.1f}s')
+        print(f'  shots to win  mean {stats["mean_shots"]:.2f}  median {stats["median_shots"]}'
+              f'  stdev {stats["stdev_shots"]:.2f}  min {stats["min_shots"]}'
+              f'  max {stats["max_shots"]}')
+        print(f'  move time ms  mean {stats["mean_latency"]*1000:.3f}'
+              f'  p50 {stats["p50_latency"]*1000:.3f}  p95 {stats["p95_latency"]*1000:.3f}'
+              f'  p99 {stats["p99_latency"]*1000:.3f}  max {stats["max_latency"]*1000:.3f}')
@@ -0,0 +1,310 @@
+'''
+State Backend Module
+
+This module stores the games of the server behind one interface, so the server can keep them
+in its own memory or share them between processes. With the SQLite backend every gunicorn
+worker opens the same database file, so the two players of a multiplayer game can be served by
+different workers, and each game is stored as one pickled record that is read, changed and
+written back in a transaction.
+
+Classes:
+- MemoryBackend: Keeps the games in a GameStore in this process.
+- SQLiteBackend: Keeps the games in a SQLite database in WAL mode, shared by every process
+  that opens it.
+
+Functions:
+- open_backend(url: str, table: str, ttl: float, max_games: int,
+               on_remove: Callable) -> MemoryBackend | SQLiteBackend:
+  Opens the backend named by a url, 'memory' or 'sqlite:///path/to/file.db'.
+
+Both backends have the same methods:
+- get(key, default=None): returns a game, or default if there is none.
+- put(key, game): adds or replaces a game.
+- update(key, create=None): a context manager giving a game to change, which is saved when the
+  block ends and cannot be changed by another request until then.
+- finish(key): removes a game that has finished.
+- stats(): the number of live games, and the number evicted and finished so far.
+
+Usage:
+- To add a player to a game that may be played in another process:
+    games = open_backend('sqlite:///games.db', 'multiplayer')
+    with games.update(gamecode, create=dict) as game:
+        game.setdefault('joined', []).append(playerid)
+
+Notes:
+- A game changed outside update or put is only saved by the memory backend, as it hands out
+  the game itself where the SQLite backend hands out a copy.
+- Games are evicted by both backends when idle for longer than ttl seconds or when they are
+  the least recently used past max_games, but the SQLite backend only counts a game as used
+  when it is written, so reading a game does not take the write lock of the database.
+'''
+
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable
+
+from game_sessions import GameStore
+
+# the number of locks the memory backend shares out between games
+LOCK_STRIPES = 64
+
+
+class MemoryBackend:
+    '''
+    this class keeps games in a GameStore in this process, an update locks one of
+    LOCK_STRIPES locks chosen by the key, so updates to different games rarely wait
+    '''
+
+    def __init__(self,ttl:float = 3600,max_games:int = 10000,on_remove:Callable = None):
+        '''
+        this function initialises an empty backend
+        Args:
+            ttl (float): the seconds a game can go without being used (default 3600)
+            max_games (int): the most games kept at once (default 10000)
+            on_remove (Callable): called with each game that is removed (default None)
+        '''
+        self.store = GameStore(ttl=ttl,max_games=max_games,on_remove=on_remove)
+        self.locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+
+    def __contains__(self,key:str)->bool:
+        '''if there is a game for a key'''
+        return key in self.store
+
+    def get(self,key:str,default = None):
+        '''returns the game for a key, or default if there is none'''
+        return self.store.get(key,default)
+
+    def put(self,key:str,game):
+        '''adds or replaces the game for a key'''
+        self.store[key] = game
+
+    @contextmanager
+    def update(self,key:str,create:Callable = None):
+        '''
+        gives the game for a key to change, no other update of the game runs until it ends
+        Args:
+            key (str): the key of the game
+            create (Callable): creates the game if there is none (default None)
+        Raises:
+            KeyError: if there is no game and create is None
+        '''
+        with self.locks[hash(key) % LOCK_STRIPES]:
+            game = self.store.get(key)
+            if game is None:
+                if create is None:
+                    raise KeyError(key)
+                game = create()
+                self.store[key] = game
+            yield game
+
+    def finish(self,key:str):
+        '''removes a game that has finished'''
+        self.store.finish(key)
+
+    def stats(self)->dict[str,int]:
+        '''returns the number of live games and the number evicted and finished so far'''
+        return self.store.stats()
+
+
+class SQLiteBackend:
+    '''
+    this class keeps games as pickled records in a table of a SQLite database in WAL mode,
+    each process has one connection that its threads and green threads take turns on, and an
+    update holds the write lock of the database from reading the game to writing it back,
+    reads do not take the write lock, so a game is only marked as used and games are only
+    evicted when a game is written
+    '''
+
+    def __init__(self,path:str,table:str = 'games',ttl:float = 3600,max_games:int = 10000):
+        '''
+        this function opens the database and creates the tables if they do not exist
+        Args:
+            path (str): the file of the database
+            table (str): the table of the games, so one database can hold several kinds
+            (default 'games')
+            ttl (float): the seconds a game can go without being used (default 3600)
+            max_games (int): the most games kept at once (default 10000)
+        Raises:
+            ValueError: if the table name is not a python identifier
+        '''
+        if not table.isidentifier():
+            raise ValueError('table must be a python identifier')
+        self.path = path
+        self.table = table
+        self.ttl = ttl
+        self.max_games = max_games
+        # the connection of this process, the lock its transactions take turns with,
+        # and the process they belong to, so a forked process opens its own
+        self.db = None
+        self.lock = None
+        self.pid = None
+        with self.transaction() as connection:
+            connection.execute(f'CREATE TABLE IF NOT EXISTS {table} '
+                               '(key TEXT PRIMARY KEY, data BLOB NOT NULL, last_used REAL NOT NULL)')
+            connection.execute(f'CREATE INDEX IF NOT EXISTS {table}_last_used '
+                               f'ON {table} (last_used)')
+            connection.execute('CREATE TABLE IF NOT EXISTS counters '
+                               '(name TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+            for counter in ('evicted','finished'):
+                connection.execute('INSERT OR IGNORE INTO counters VALUES (?,0)',
+                                   (f'{table}.{counter}',))
+
+    def open(self):
+        '''
+        opens the connection of this process, which is done the first time it is used and
+        again in a forked process, whose copy of the parent's connection and lock must not
+        be used, the process is only set once both are ready
+        '''
+        connection = sqlite3.connect(self.path,timeout=30,isolation_level=None,
+                                     check_same_thread=False)
+        connection.execute('PRAGMA journal_mode=WAL')
+        # a commit only waits for the WAL to be written, not for it to reach the disk
+        connection.execute('PRAGMA synchronous=NORMAL')
+        self.db = connection
+        self.lock = threading.Lock()
+        self.pid = os.getpid()
+
+    @contextmanager
+    def transaction(self,write:bool = True):
+        '''
+        runs a block in a transaction, committing it if the block ends normally and rolling it
+        back if it raises, the transactions of a process take turns on its connection
+        Args:
+            write (bool): if the transaction takes the write lock of the database from the
+            start, otherwise it only reads, which in WAL mode does not wait for other
+            processes' writes or make them wait (default True)
+        '''
+        if self.pid != os.getpid():
+            self.open()
+        with self.lock:
+            connection = self.db
+            connection.execute('BEGIN IMMEDIATE' if write else 'BEGIN')
+            try:
+                yield connection
+            except BaseException:
+                connection.execute('ROLLBACK')
+                raise
+            connection.execute('COMMIT')
+
+    def add_to_counter(self,connection:sqlite3.Connection,counter:str,amount:int):
+        '''adds to one of the counters of the table'''
+        if amount:
+            connection.execute('UPDATE counters SET value = value + ? WHERE name = ?',
+                               (amount,f'{self.table}.{counter}'))
+
+    def evict(self,connection:sqlite3.Connection,over_max:bool = True):
+        '''
+        removes the games idle for longer than ttl, found from the index of last_used,
+        and the least recently used past max_games, in a write transaction
+        Args:
+            connection (sqlite3.Connection): the connection of the transaction
+            over_max (bool): if the games past max_games are looked for, which needs them
+            counted so is only done when a game has been added (default True)
+        '''
+        removed = connection.execute(f'DELETE FROM {self.table} WHERE last_used < ?',
+                                     (time.time()-self.ttl,)).rowcount
+        count = connection.execute(f'SELECT COUNT(*) FROM {self.table}').fetchone()[0] \
+            if over_max else 0
+        if count > self.max_games:
+            removed += connection.execute(
+                f'DELETE FROM {self.table} WHERE key IN (SELECT key FROM {self.table} '
+                'ORDER BY last_used LIMIT ?)',(count-self.max_games,)).rowcount
+        self.add_to_counter(connection,'evicted',removed)
+
+    def load(self,connection:sqlite3.Connection,key:str):
+        '''returns the game for a key, or None if there is none or it has been idle for
+        longer than ttl and is waiting to be evicted, in a transaction'''
+        row = connection.execute(f'SELECT data FROM {self.table} WHERE key = ? AND last_used >= ?',
+                                 (key,time.time()-self.ttl)).fetchone()
+        return None if row is None else pickle.loads(row[0])
+
+    def save(self,connection:sqlite3.Connection,key:str,game):
+        '''writes the game for a key, marking it as used, and evicts games, in a write
+        transaction'''
+        added = connection.execute(f'SELECT 1 FROM {self.table} WHERE key = ?',
+                                   (key,)).fetchone() is None
+        connection.execute(f'INSERT OR REPLACE INTO {self.table} VALUES (?,?,?)',
+                           (key,pickle.dumps(game,pickle.HIGHEST_PROTOCOL),time.time()))
+        self.evict(connection,over_max=added)
+
+    def __contains__(self,key:str)->bool:
+        '''if there is a game for a key'''
+        with self.transaction(write=False) as connection:
+            return connection.execute(f'SELECT 1 FROM {self.table} WHERE key = ? AND last_used >= ?',
+                                      (key,time.time()-self.ttl)).fetchone() is not None
+
+    def get(self,key:str,default = None):
+        '''returns a copy of the game for a key, or default if there is none'''
+        with self.transaction(write=False) as connection:
+            game = self.load(connection,key)
+        return default if game is None else game
+
+    def put(self,key:str,game):
+        '''adds or replaces the game for a key'''
+        with self.transaction() as connection:
+            self.save(connection,key,game)
+
+    @contextmanager
+    def update(self,key:str,create:Callable = None):
+        '''
+        gives a copy of the game for a key to change, which is written back when the block
+        ends, the block holds the write lock of the database so it should be short
+        Args:
+            key (str): the key of the game
+            create (Callable): creates the game if there is none (default None)
+        Raises:
+            KeyError: if there is no game and create is None
+        '''
+        with self.transaction() as connection:
+            game = self.load(connection,key)
+            if game is None:
+                if create is None:
+                    raise KeyError(key)
+                game = create()
+            yield game
+            self.save(connection,key,game)
+
+    def finish(self,key:str):
+        '''removes a game that has finished'''
+        with self.transaction() as connection:
+            removed = connection.execute(f'DELETE FROM {self.table} WHERE key = ?',
+                                         (key,)).rowcount
+            self.add_to_counter(connection,'finished',removed)
+
+    def stats(self)->dict[str,int]:
+        '''returns the number of live games and the number evicted and finished so far'''
+        with self.transaction() as connection:
+            self.evict(connection)
+            live = connection.execute(f'SELECT COUNT(*) FROM {self.table}').fetchone()[0]
+            counters = dict(connection.execute(
+                'SELECT name, value FROM counters WHERE name IN (?,?)',
+                (f'{self.table}.evicted',f'{self.table}.finished')).fetchall())
+        return {'live':live,'evicted':counters[f'{self.table}.evicted'],
+                'finished':counters[f'{self.table}.finished']}
+
+
+def open_backend(url:str,table:str,ttl:float = 3600,max_games:int = 10000,
+                 on_remove:Callable = None):
+    '''
+    opens the backend named by a url
+    Args:
+        url (str): 'memory', or 'sqlite:///' followed by the path of the database
+        table (str): the name of the kind of game, the table used by the SQLite backend
+        ttl (float): the seconds a game can go without being used (default 3600)
+        max_games (int): the most games kept at once (default 10000)
+        on_remove (Callable): called with each game removed by the memory backend, the SQLite
+        backend holds nothing open for a game (default None)
+    Returns:
+        MemoryBackend | SQLiteBackend: the backend
+    Raises:
+        ValueError: if the url is not 'memory' or a sqlite url
+    '''
+    if url == 'memory':
+        return MemoryBackend(ttl=ttl,max_games=max_games,on_remove=on_remove)
+    if url.startswith('sqlite:///'):
+        return SQLiteBackend(url[len('sqlite:///'):],table=table,ttl=ttl,max_games=max_games)
+    raise ValueError('the state backend must be "memory" or "sqlite:///path"')
@@ -0,0 +1,203 @@
+import random
+import time
+
+import pytest
+
+from aiClass import mainAI, EndgameSolver, MoveCache, PosteriorSampler
+from bitboard import cell_bit
+from opening_book import OpeningBook, build_opening_book, load_opening_book, save_opening_book
+
+
+def test_density_updates_match_fresh_count():
+    """
+    Test if the placement counts kept up to date after each shot match counting again from scratch.
+    """
+    random.seed(0)
+    ai = mainAI(10)
+    cells = [(x, y) for x in range(10) for y in range(10)]
+    random.shuffle(cells)
+    for ship_length in range(1, 6):
+        ai.create_placement_count(ship_length)
+    for coord in cells[:40]:
+        ai.register_shot(coord, random.random() < 0.3)
+        fresh = mainAI(10, hits=list(ai.hits), misses=list(ai.misses))
+        for ship_length in range(1, 6):
+            assert ai.create_placement_count(ship_length) == fresh.create_placement_count(ship_length), \
+                "create_placement_count does not match a fresh count after a shot"
+        assert ai.generate_hit_search() == fresh.generate_hit_search(), \
+            "generate_hit_search does not match a fresh search after a shot"
+
+
+def test_numpy_backend_matches_python_backend():
+    """
+    Test if the numpy backend gives exactly the same counts and search coordinate as the python backend.
+    """
+    pytest.importorskip('numpy')
+    random.seed(1)
+    for size in [5, 10, 12]:
+        cells = [(x, y) for x in range(size) for y in range(size)]
+        shots = random.sample(cells, size * 2)
+        python_ai = mainAI(size, hits=shots[:size], misses=shots[size:])
+        numpy_ai = mainAI(size, hits=shots[:size], misses=shots[size:], backend='numpy')
+        for ship_length in range(0, 7):
+            assert python_ai.create_placement_count(ship_length) == numpy_ai.create_placement_count(ship_length), \
+                "numpy backend counts do not match the python backend"
+        python_ai.ships = numpy_ai.ships = {'ship1': 5, 'ship2': 3, 'ship3': 2}
+        assert python_ai.generate_hit_search() == numpy_ai.generate_hit_search(), \
+            "numpy backend search coordinate does not match the python backend"
+
+
+def test_new_next_move_keeps_to_time_allowed():
+    """
+    Test if new_next_move chooses a move within time_allowed, and uses the placement counts when there is no time.
+    """
+    ai = mainAI(10, time_allowed=0.05, misses=[(0, 0), (5, 5)])
+    ships = {'ship1': 5, 'ship2': 4, 'ship3': 3}
+    start = time.time()
+    x, y = ai.new_next_move(ships)
+    assert time.time() - start < 0.5, "new_next_move takes much longer than time_allowed"
+    assert (x, y) not in ai.misses and 0 <= x < 10 and 0 <= y < 10, "new_next_move chooses an invalid move"
+
+    no_time_ai = mainAI(10, time_allowed=0, misses=[(0, 0), (5, 5)])
+    no_time_ai.ships = ships
+    assert no_time_ai.new_next_move(ships) == no_time_ai.generate_hit_search(), \
+        "new_next_move does not fall back to the placement counts when there is no time"
+
+
+def test_posterior_sampler_layouts_are_consistent():
+    """
+    Test if every layout drawn by the PosteriorSampler avoids the misses, covers the hits and has no overlaps.
+    """
+    hits = cell_bit(3, 3, 10) | cell_bit(4, 3, 10)
+    misses = cell_bit(5, 3, 10) | cell_bit(0, 0, 10)
+    fleet = {'ship1': 5, 'ship2': 4, 'ship3': 3, 'ship4': 2}
+    remaining = {'ship1': 3, 'ship2': 4, 'ship3': 3, 'ship4': 2}
+    sampler = PosteriorSampler(10, fleet, remaining, hits, misses, seed=1)
+    for _ in range(200):
+        layout = sampler.sample()
+        if layout is None:
+            continue
+        taken = 0
+        for mask in layout:
+            assert mask & taken == 0, "PosteriorSampler draws overlapping ships"
+            assert mask & misses == 0, "PosteriorSampler draws a ship on a miss"
+            taken |= mask
+        assert taken & hits == hits, "PosteriorSampler draws a layout that does not cover the hits"
+    assert PosteriorSampler(10, fleet, remaining, hits, misses, seed=2).tally(500) == PosteriorSampler(10, fleet, remaining, hits, misses, seed=2).tally(500), \
+        "PosteriorSampler is not reproducible with a seed"
+
+
+def test_move_cache_shared_between_ais():
+    """
+    Test if a shared move cache answers a repeated state from another AI and keeps to its size.
+    """
+    cache = MoveCache(maxsize=2)
+    first = mainAI(10, misses=[(0, 0)], move_cache=cache)
+    second = mainAI(10, misses=[(0, 0)], move_cache=cache)
+    first.ships = second.ships = {'ship1': 3, 'ship2': 2}
+    move = first.generate_hit_search()
+    assert (cache.cache_hits, cache.cache_misses) == (0, 1), "the first search was not counted as a cache miss"
+    assert second.generate_hit_search() == move, "the cached move is different"
+    assert cache.cache_hits == 1, "the repeated state was not answered from the cache"
+
+    second.register_shot(move, False)
+    second.generate_hit_search()
+    second.register_shot((9, 9), False)
+    second.generate_hit_search()
+    assert len(cache) == 2, "the cache grew past its maxsize"
+
+
+def test_opening_book_round_trip_and_play(tmp_path):
+    """
+    Test if an opening book survives being saved and loaded, and the AI plays it until it leaves the book.
+    """
+    fleet = {'ship1': 3, 'ship2': 2}
+    moves = build_opening_book(6, fleet, 3, samples=200)
+    filename = str(tmp_path / 'book.bin')
+    save_opening_book(filename, OpeningBook(6, list(fleet.values()), moves))
+    book = load_opening_book(filename)
+    assert book.moves == moves and book.size == 6, "opening book changes when saved and loaded"
+
+    ai = mainAI(6, time_allowed=0, opening_book=book)
+    ai.fleet = dict(fleet)
+    assert ai.new_next_move(dict(fleet)) == moves[0], "AI does not play the first book move"
+    ai.register_shot(moves[0], False)
+    assert ai.new_next_move(dict(fleet)) == moves[1], "AI does not play the book after a miss"
+    ai.register_shot(moves[1], True)
+    assert book.move_for(6, fleet, ai.hits, ai.misses) is None, "the book has a move for a state with a hit"
+    assert ai.next_to_live_hit(ai.new_next_move({'ship1': 2, 'ship2': 2})), "AI does not leave the book to follow up a hit"
+
+
+def test_target_queue_has_no_duplicates_or_shot_cells():
+    """
+    Test if the AI queues each neighbour of its hits once and never fires at a queued cell that was already shot.
+    """
+    ai = mainAI(10, time_allowed=0)
+    ships = {'ship1': 5}
+    ai.register_shot((4, 4), True)
+    ai.register_shot((6, 4), True)
+    assert len(ai.queue) == 7, "the shared neighbour of two hits is queued twice"
+    ai.register_shot((5, 4), True)
+    moves = set()
+    while len(ai.queue) > 0:
+        move = ai.new_next_move(ships)
+        assert not ai.is_shot(move), "new_next_move fires at a cell that was already shot"
+        moves.add(move)
+        ai.register_shot(move, False)
+    assert (5, 4) not in moves, "new_next_move fires at a stale queue entry"
+
+
+def test_target_mode_follows_line_and_forgets_sunk_ship():
+    """
+    Test if the AI extends a line of hits along its axis, and stops following up a ship once it is sunk.
+    """
+    ai = mainAI(10, time_allowed=0)
+    ai.fleet = {'ship1': 3, 'ship2': 2}
+    ships = {'ship1': 3, 'ship2': 2}
+    ai.new_next_move(ships)
+    ai.register_shot((4, 4), True)
+    ai.register_shot((5, 4), True)
+    ships['ship1'] = 1
+    assert ai.new_next_move(ships) in [(3, 4), (6, 4)], "AI does not extend the line of hits"
+    ai.register_shot((3, 4), False)
+    assert ai.new_next_move(ships) == (6, 4), "AI does not try the other end of the line"
+    ai.register_shot((6, 4), True)
+    ships['ship1'] = 0
+    ai.new_next_move(ships)
+    assert ai.sunk_cells == {(4, 4), (5, 4), (6, 4)}, "AI does not work out the cells of the sunk ship"
+    assert not ai.live_hits and len(ai.queue) == 0, "AI still follows up the sunk ship"
+
+
+def test_hunt_uses_parity_of_smallest_ship_left():
+    """
+    Test if hunting only scores the lattice of the smallest ship left, and the lattice grows sparser as small ships sink.
+    """
+    ai = mainAI(10, time_allowed=0)
+    ai.fleet = {'ship1': 4, 'ship2': 3, 'ship3': 2}
+    ai.ships = {'ship1': 4, 'ship2': 3, 'ship3': 2}
+    assert len(ai.hunt_cells()) == 50, "hunting does not use the lattice of the smallest ship"
+    x, y = ai.generate_hit_search()
+    assert (x + y) % 2 == 0, "hunting chooses a cell off the lattice"
+    ai.ships = {'ship1': 4, 'ship2': 3, 'ship3': 0}
+    x, y = ai.generate_hit_search()
+    assert len(ai.hunt_cells()) == 34 and (x + y) % 3 == 0, "the lattice does not change when the smallest ship sinks"
+
+
+def test_endgame_solver_minimises_expected_shots():
+    """
+    Test if the endgame solver enumerates the consistent layouts and chooses the shot with the fewest expected shots to finish.
+    """
+    misses = 0
+    for y in range(1, 3):
+        for x in range(3):
+            misses |= cell_bit(x, y, 3)
+    solver = EndgameSolver(3, {'ship1': 2}, {'ship1': 2}, 0, misses)
+    worlds = solver.worlds()
+    assert sorted(worlds) == [0b011, 0b110], "endgame solver does not find both layouts of the ship"
+    expected, cell = solver.expected_shots(worlds)
+    assert cell == 1 and expected == 2.5, "endgame solver does not shoot the cell both layouts share first"
+    assert solver.solve() == (1, 0), "endgame solver does not choose the best shot"
+
+    ai = mainAI(3, time_allowed=1, misses=[(x, y) for x in range(3) for y in range(1, 3)])
+    ai.fleet = {'ship1': 2}
+    assert ai.new_next_move({'ship1': 2}) == (1, 0), "AI does not use the endgame solver near the end of a game"
@@ -0,0 +1,97 @@
+from ai_pool import AIPool, quick_move
+from aiClass import MoveCache, mainAI
+from components import create_battleships
+
+
+def test_pool_chooses_moves_in_a_worker():
+    """
+    Test if a move chosen in a worker is returned with the AI that chose it.
+    """
+    pool = AIPool(workers=1, timeout=60)
+    ai = mainAI(10, time_allowed=0)
+    try:
+        move, worker_ai = pool.next_move(ai, create_battleships())
+    finally:
+        pool.shutdown()
+    assert worker_ai is not ai, "the AI was not replaced by the worker's AI"
+    assert 0 <= move[0] < 10 and 0 <= move[1] < 10, "move is off the board"
+    assert pool.stats() == {'moves': 1, 'speculated': 0, 'saturated': 0, 'timeouts': 0, 'broken': 0}, \
+        "counters are wrong"
+
+
+def test_pool_falls_back_when_saturated_or_slow():
+    """
+    Test if a move is chosen in this process when no move can wait or the worker is too slow.
+    """
+    ai = mainAI(10, time_allowed=0)
+    saturated = AIPool(workers=1, max_pending=0)
+    move, same_ai = saturated.next_move(ai, create_battleships())
+    assert same_ai is ai and saturated.executor is None, "a saturated pool used a worker"
+    assert 0 <= move[0] < 10 and 0 <= move[1] < 10, "fallback move is off the board"
+    # the worker is still starting when the request stops waiting
+    slow = AIPool(workers=1, timeout=0)
+    try:
+        _, same_ai = slow.next_move(ai, create_battleships())
+    finally:
+        slow.shutdown()
+    assert same_ai is ai, "a timed out move did not keep the AI"
+    assert slow.stats() == {'moves': 0, 'speculated': 0, 'saturated': 0, 'timeouts': 1, 'broken': 0}, \
+        "counters are wrong"
+
+
+def test_pool_hands_over_speculated_moves():
+    """
+    Test if a speculated move is handed over, and dropped if the AI changed since.
+    """
+    pool = AIPool(workers=1, timeout=60)
+    ai = mainAI(10, time_allowed=0)
+    ships = create_battleships()
+    try:
+        pool.speculate('game', ai, ships)
+        move, ai = pool.next_move(ai, ships, key='game')
+        assert pool.stats()['speculated'] == 1, "speculated move was not handed over"
+        pool.speculate('game', ai, ships)
+        ai.register_shot(move, False)
+        next_move, _ = pool.next_move(ai, ships, key='game')
+    finally:
+        pool.shutdown()
+    assert next_move != move, "a move speculated before the last shot was handed over"
+    assert pool.stats()['speculated'] == 1 and pool.stats()['moves'] == 2, "counters are wrong"
+    # a speculated move that times out is only counted as a timeout
+    slow = AIPool(workers=1, timeout=0)
+    try:
+        slow.speculate('game', ai, ships)
+        slow.next_move(ai, ships, key='game')
+    finally:
+        slow.shutdown()
+    assert slow.stats()['speculated'] == 0 and slow.stats()['timeouts'] == 1, \
+        "a timed out speculation was counted as handed over"
+
+
+def test_quick_move_is_not_cached_as_a_searched_move():
+    """
+    Test if a quick move is cached apart from the refined moves an AI with time to search uses.
+    """
+    cache = MoveCache()
+    ai = mainAI(10, time_allowed=1, move_cache=cache)
+    quick_move(ai, create_battleships())
+    assert cache.get(ai.state_key(refined=True)) is None, "quick move was cached as a refined move"
+    assert cache.get(ai.state_key(refined=False)) is not None, "quick move was not cached"
+
+
+def test_pool_falls_back_when_workers_cannot_start(monkeypatch):
+    """
+    Test if a move is chosen in this process when the worker processes cannot be started.
+    """
+    pool = AIPool(workers=1)
+
+    def fail():
+        raise OSError('cannot start workers')
+
+    monkeypatch.setattr(pool, 'get_executor', fail)
+    ai = mainAI(10, time_allowed=0)
+    move, same_ai = pool.next_move(ai, create_battleships())
+    assert same_ai is ai and 0 <= move[0] < 10 and 0 <= move[1] < 10, "no move was chosen in this process"
+    pool.speculate('game', ai, create_battleships())
+    assert not pool.speculations, "a move that could not be started was kept as a speculation"
+    assert pool.stats()['broken'] == 1 and pool.stats()['saturated'] == 0, "the fallback was not counted as broken"
@@ -0,0 +1,47 @@
+import pytest
+
+from components import generate_layouts, layout_to_board
+from game_engine import attack, check_if_game_over
+
+np = pytest.importorskip('numpy')
+from batch_game import BatchGame
+
+
+def test_batch_game_matches_game_engine():
+    """
+    Test if every step of a BatchGame gives the same hits, sunk ships and game overs as game_engine.
+    """
+    ships = {'ship1': 3, 'ship2': 2, 'ship3': 2}
+    layouts = generate_layouts(20, 5, ships, seed=1)
+    games = BatchGame(5, ships, 20, layouts=layouts)
+    boards = [layout_to_board(layouts, i, 5, ships) for i in range(20)]
+    fleets = [dict(ships) for _ in range(20)]
+    rng = np.random.default_rng(0)
+    while games.active.size:
+        active = list(games.active)
+        x, y = games.random_attack(rng)
+        hits, sunk, over = games.step(x, y)
+        for i, game in enumerate(active):
+            before = sum(1 for left in fleets[game].values() if left == 0)
+            hit = attack((int(x[i]), int(y[i])), boards[game], fleets[game])
+            after = sum(1 for left in fleets[game].values() if left == 0)
+            assert hits[i] == hit, "BatchGame hit does not match attack"
+            assert sunk[i] == (after > before), "BatchGame sunk does not match the ships dictionary"
+            assert over[i] == check_if_game_over(fleets[game]), "BatchGame game over does not match"
+    assert games.shots_to_win.min() >= 7 and games.shots_to_win.max() <= 25, "shots to win are wrong"
+
+
+def test_batch_game_retires_without_moving_boards():
+    """
+    Test if finished games leave the active games and the boards of the others stay in place.
+    """
+    games = BatchGame(3, {'ship1': 1}, 4, seed=2)
+    ship_at = games.ship_at
+    cells = ship_at.argmax(axis=1)
+    # the first two games fire at their ship, the others fire at an empty cell
+    target = np.where(np.arange(4) < 2, cells, (cells + 1) % 9)
+    hits, sunk, over = games.step(target % 3, target // 3)
+    assert list(over) == [True, True, False, False], "the wrong games are over"
+    assert list(games.active) == [2, 3], "finished games were not retired"
+    assert games.ship_at is ship_at, "the boards were copied"
+    assert list(games.shots_to_win) == [1, 1, 0, 0], "shots to win were not recorded"
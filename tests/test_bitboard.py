@@ -0,0 +1,78 @@
+import random
+
+import pytest
+
+from bitboard import BitBoard, board_to_bitboard, bitboard_to_board, cell_bit, placement_index
+from components import initialise_board, place_battleships, is_valid_placement, place_battleship_on_board
+from game_engine import attack, check_if_game_over
+
+
+def test_bitboard_round_trip():
+    """
+    Test if converting a board to a BitBoard and back gives the same board.
+    """
+    random.seed(0)
+    board = place_battleships(initialise_board(10), {'ship1': 5, 'ship2': 3, 'ship3': 2}, algorithm='random')
+    assert bitboard_to_board(board_to_bitboard(board)) == board, "converting to a BitBoard and back changes the board"
+
+
+def test_bitboard_is_valid_placement_matches_list_board():
+    """
+    Test if is_valid_placement gives the same answer for a BitBoard and a list board.
+    """
+    board = [[None, None, None, None],
+             [None, 'ship', None, None],
+             [None, None, None, None],
+             [None, None, None, None]]
+    bitboard = board_to_bitboard(board)
+    for y in range(4):
+        for x in range(4):
+            for orientation in ['horizontal', 'vertical']:
+                for ship_length in range(1, 5):
+                    assert is_valid_placement(bitboard, x, y, ship_length, orientation) == \
+                        is_valid_placement(board, x, y, ship_length, orientation), \
+                        "is_valid_placement gives a different answer for a BitBoard"
+
+
+def test_bitboard_place_and_attack():
+    """
+    Test if attacking a BitBoard updates the ships dictionary and ends the game.
+    """
+    bitboard = BitBoard(3)
+    ships = {'ship1': 2}
+    assert place_battleship_on_board(bitboard, 1, 0, 2, 'ship1', 'vertical') is bitboard, "ship was not placed"
+    assert place_battleship_on_board(bitboard, 0, 1, 2, 'ship2') == -1, "overlapping ship was placed"
+    assert attack((0, 0), bitboard, ships) is False, "attack on an empty cell hit"
+    assert attack((1, 0), bitboard, ships) is True, "attack on a ship missed"
+    assert ships['ship1'] == 1 and bitboard.remaining('ship1') == 1, "hit was not removed from the ship"
+    assert check_if_game_over(bitboard) is False, "game ended with a ship cell remaining"
+    attack((1, 1), bitboard, ships)
+    assert check_if_game_over(bitboard) is True and check_if_game_over(ships) is True, "game did not end"
+
+
+def test_placement_index_matches_is_valid_placement():
+    """
+    Test if the placement index holds exactly the placements that fit on an empty board.
+    """
+    size = 5
+    board = initialise_board(size)
+    for ship_length in range(1, size + 1):
+        indexed = {(p.x, p.y, p.orientation) for p in placement_index(size, ship_length)}
+        expected = {(x, y, orientation) for x in range(size) for y in range(size)
+                    for orientation in ['horizontal', 'vertical']
+                    if is_valid_placement(board, x, y, ship_length, orientation)}
+        assert indexed == expected, "placement_index does not match is_valid_placement"
+        assert placement_index(size, ship_length) is placement_index(size, ship_length), "placement_index is not cached"
+
+
+def test_off_board_coordinates_are_rejected():
+    """
+    Test if cells off the board raise, and placements starting off the board are invalid.
+    """
+    with pytest.raises(IndexError):
+        cell_bit(10, 0, 10)
+    with pytest.raises(IndexError):
+        cell_bit(0, -1, 10)
+    for board in (initialise_board(10), BitBoard(10)):
+        assert not is_valid_placement(board, 10, 0, 1), "placement off the right edge is valid"
+        assert not is_valid_placement(board, -1, 0, 2), "placement off the left edge is valid"
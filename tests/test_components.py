@@ -1,6 +1,8 @@
 from components import is_valid_placement, place_battleship_on_board, random_battleship_placement
+import os
 import random
-from components import is_valid_placement, random_battleship_placement, place_battleship_on_board
+from components import is_valid_placement, random_battleship_placement, place_battleship_on_board, generate_layouts, layout_to_board
+from components import create_battleships, FleetRegistry
 def test_is_valid_placement_horizontal():
     """
     Test if the is_valid_placement function correctly checks if a ship can be placed horizontally on the board.
@@ -196,4 +198,71 @@ def test_place_battleship_on_board_multiple_ships():
     expected_board = [['ship1', 'ship1', 'ship1'],
                       [None, 'ship2', None],
                       [None, 'ship2', None]]
-    assert place_battleship_on_board(board, x, y, ship_length[ship_name], ship_name, orientation) == expected_board, "place_battleship_on_board function does not correctly place multiple battleships on the board"
\ No newline at end of file
+    assert place_battleship_on_board(board, x, y, ship_length[ship_name], ship_name, orientation) == expected_board, "place_battleship_on_board function does not correctly place multiple battleships on the board"
+
+def test_random_battleship_placement_full_board():
+    """
+    Test if the random_battleship_placement function fills a board that only has room for one layout.
+    """
+    random.seed(0)
+    board = [[None, None, None],
+             [None, None, None],
+             [None, None, None]]
+    battleships = {'ship1': 3, 'ship2': 3, 'ship3': 3}
+    new_board = random_battleship_placement(board, battleships)
+    assert all(cell is not None for row in new_board for cell in row), "random_battleship_placement function does not fill the board"
+
+
+def test_random_battleship_placement_impossible():
+    """
+    Test if the random_battleship_placement function raises a ValueError when the ships cannot fit.
+    """
+    board = [[None, None],
+             [None, None]]
+    try:
+        random_battleship_placement(board, {'ship1': 2, 'ship2': 2, 'ship3': 1})
+        assert False, "random_battleship_placement function should raise a ValueError when the ships cannot fit"
+    except ValueError:
+        assert True
+
+
+def test_generate_layouts():
+    """
+    Test if the generate_layouts function makes valid, reproducible layouts.
+    """
+    ships = {'ship1': 5, 'ship2': 4, 'ship3': 3, 'ship4': 3, 'ship5': 2}
+    layouts = generate_layouts(50, 10, ships, seed=1)
+    assert len(layouts) == 50 * len(ships), "generate_layouts function does not make one entry per ship per layout"
+    assert layouts == generate_layouts(50, 10, ships, seed=1), "generate_layouts function is not reproducible with a seed"
+    for i in range(50):
+        board = layout_to_board(layouts, i, 10, ships)
+        for ship in ships:
+            assert sum(row.count(ship) for row in board) == ships[ship], "generate_layouts function makes overlapping ships"
+
+
+def test_create_battleships_reloads_modified_file(tmp_path):
+    """
+    Test if create_battleships returns fresh copies and reads the file again once it is modified.
+    """
+    filename = tmp_path / 'ships.txt'
+    filename.write_text('ship1:3\nship2:2', encoding='utf-8')
+    ships = create_battleships(str(filename))
+    ships['ship1'] = 0
+    assert create_battleships(str(filename)) == {'ship1': 3, 'ship2': 2}, "create_battleships returns a shared dictionary"
+
+    filename.write_text('ship1:4', encoding='utf-8')
+    os.utime(filename, ns=(1, 1))
+    assert create_battleships(str(filename)) == {'ship1': 4}, "create_battleships does not read a modified file again"
+
+
+def test_fleet_registry_named_fleets(tmp_path):
+    """
+    Test if the fleet registry keeps several named fleets.
+    """
+    small = tmp_path / 'small.txt'
+    small.write_text('ship1:2', encoding='utf-8')
+    registry = FleetRegistry()
+    registry.register('default', 'battleships.txt')
+    registry.register('small', str(small))
+    assert registry.get('small') == {'ship1': 2}, "fleet registry does not return the named fleet"
+    assert registry.get() == create_battleships('battleships.txt'), "fleet registry does not return the default fleet"
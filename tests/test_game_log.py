@@ -0,0 +1,68 @@
+import copy
+import pickle
+import random
+
+from components import initialise_board, place_battleships
+from game_log import GameLog, GameReplay, logged_attack
+
+
+def test_replay_rebuilds_every_move(tmp_path):
+    """
+    Test if replaying a log gives the boards and ships of both players after every shot of a game.
+    """
+    random.seed(4)
+    ships = {'ship1': 4, 'ship2': 3, 'ship3': 2}
+    boards = [place_battleships(initialise_board(6), ships, algorithm='random') for _ in range(2)]
+    fleets = [dict(ships), dict(ships)]
+    game_log = GameLog(str(tmp_path / 'game.log'), 6, ships)
+    game_log.log_board(0, boards[0])
+    game_log.log_board(1, boards[1])
+    history = [copy.deepcopy((boards, fleets))]
+    cells = [(x, y) for x in range(6) for y in range(6)]
+    shots = [random.sample(cells, len(cells)) for _ in range(2)]
+    for move in range(40):
+        player = move % 2
+        logged_attack(game_log, player, shots[player][move // 2], boards[1 - player], fleets[1 - player])
+        history.append(copy.deepcopy((boards, fleets)))
+
+    replay = GameReplay(str(tmp_path / 'game.log'), snapshot_interval=8)
+    assert len(replay) == 40 and replay.ships == ships, "log does not hold every shot and the fleet"
+    for move in [0, 1, 7, 8, 9, 23, 40]:
+        state = replay.state_at(move)
+        for player in range(2):
+            board, fleet = state[player]
+            assert board.to_board() == history[move][0][player], "replayed board does not match the game"
+            assert fleet == history[move][1][player], "replayed ships do not match the game"
+    player, coords, ship_name, hit, sunk = replay.shots()[0]
+    assert (player, coords) == (0, shots[0][0]) and hit == (ship_name is not None), "shot record is wrong"
+    assert sum(sunk for *_, sunk in replay.shots()) == sum(left == 0 for fleet in fleets for left in fleet.values()), \
+        "sunk ships were not recorded"
+
+
+def test_replay_ignores_partly_written_record(tmp_path):
+    """
+    Test if a record cut off by the end of the file is left out of the replay.
+    """
+    ships = {'ship1': 2}
+    board = place_battleships(initialise_board(3), ships)
+    game_log = GameLog(str(tmp_path / 'game.log'), 3, ships)
+    game_log.log_board(1, board)
+    logged_attack(game_log, 0, (0, 0), board, ships)
+    with open(tmp_path / 'game.log', 'ab') as f:
+        f.write(b'\x01\x00')
+    replay = GameReplay(str(tmp_path / 'game.log'))
+    assert len(replay) == 1 and replay.state_at(1)[1][1] == {'ship1': 1}, "partly written record was replayed"
+
+
+def test_pickled_log_appends_to_the_same_file(tmp_path):
+    """
+    Test if a log loaded from a pickle, as the SQLite backend does, keeps writing to its file.
+    """
+    ships = {'ship1': 2}
+    board = place_battleships(initialise_board(3), ships)
+    game_log = GameLog(str(tmp_path / 'game.log'), 3, ships)
+    game_log.log_board(1, board)
+    loaded = pickle.loads(pickle.dumps(game_log))
+    assert vars(loaded) == vars(game_log), "a pickled log holds more than its file name and ships"
+    logged_attack(loaded, 0, (0, 0), board, ships)
+    assert len(GameReplay(str(tmp_path / 'game.log'))) == 1, "shot from the loaded log was not written"
@@ -0,0 +1,45 @@
+from aiClass import mainAI
+from game_engine import attack
+from game_sessions import GameStore, SinglePlayerGame
+from state_backend import MemoryBackend
+
+
+def test_each_session_has_its_own_game():
+    """
+    Test if the backend that replaced the GameRegistry gives each session its own boards, ships and AI.
+    """
+    games = MemoryBackend()
+    games.put('a', SinglePlayerGame(10, mainAI(10)))
+    games.put('b', SinglePlayerGame(10, mainAI(10)))
+    first = games.get('a')
+    second = games.get('b')
+    assert games.get('a') is first and games.stats()['live'] == 2, "a session was given a second game"
+    assert first.AI is not second.AI and first.AI_ships is not second.AI_ships, "sessions share a game"
+    for x in range(10):
+        for y in range(10):
+            attack((x, y), first.AI_board, first.AI_ships)
+    assert any(second.AI_ships.values()), "attacking one game changed another"
+    games.put('a', SinglePlayerGame(10, mainAI(10)))
+    assert games.get('a') is not first, "starting a game did not replace the session's game"
+
+
+def test_game_store_removes_idle_finished_and_excess_games():
+    """
+    Test if the game store evicts idle games and the least recently used past its cap, and removes finished games.
+    """
+    now = [0.0]
+    removed = []
+    store = GameStore(ttl=10, max_games=2, on_remove=removed.append, clock=lambda: now[0])
+    store['a'] = {'game': 'a'}
+    store['b'] = {'game': 'b'}
+    now[0] = 5
+    assert store['a'] == {'game': 'a'}, "game was not returned"
+    store['c'] = {'game': 'c'}
+    assert 'b' not in store and removed == [{'game': 'b'}], "least recently used game was not evicted"
+    now[0] = 14
+    assert 'a' in store and 'c' in store, "games still in use were evicted"
+    store.finish('c')
+    now[0] = 100
+    assert store.get('a') is None, "idle game was not evicted"
+    assert store.stats() == {'live': 0, 'evicted': 2, 'finished': 1}, "counters are wrong"
+    assert len(removed) == 3, "on_remove was not called for every removed game"
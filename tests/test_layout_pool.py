@@ -0,0 +1,44 @@
+import time
+
+from components import create_battleships
+from layout_pool import LayoutPool
+
+
+def wait_until_filled(pool):
+    """
+    Waits for the filling threads of a pool to finish.
+    """
+    deadline = time.time() + 10
+    while pool.filling and time.time() < deadline:
+        time.sleep(0.01)
+
+
+def test_pool_is_filled_in_the_background():
+    """
+    Test if a pool is filled to its depth, and filled again once it falls below the low water mark.
+    """
+    ships = create_battleships()
+    pool = LayoutPool(depth=8, low_water=4, batch=3)
+    pool.warm(10, ships)
+    wait_until_filled(pool)
+    assert pool.stats() == {'ready': 8, 'taken': 0, 'misses': 0}, "pool was not filled"
+    boards = [pool.take(10, ships) for _ in range(5)]
+    for board in boards:
+        for name, length in ships.items():
+            assert sum(row.count(name) for row in board) == length, f"{name} is not placed"
+    assert len({str(board) for board in boards}) == 5, "the same board was taken twice"
+    wait_until_filled(pool)
+    assert pool.stats() == {'ready': 8, 'taken': 5, 'misses': 0}, "pool was not filled again"
+
+
+def test_empty_pool_places_ships():
+    """
+    Test if a board is still placed when its pool is empty.
+    """
+    ships = create_battleships()
+    pool = LayoutPool(depth=4, low_water=2)
+    board = pool.take(10, ships)
+    assert sum(cell is not None for row in board for cell in row) == sum(ships.values()), \
+        "ships were not placed"
+    assert pool.stats()['misses'] == 1, "the empty pool was not counted"
+    wait_until_filled(pool)
@@ -0,0 +1,123 @@
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+import main
+from ai_pool import quick_move
+
+
+@pytest.fixture(autouse=True)
+def game_log_dir(tmp_path, monkeypatch):
+    """
+    Writes the logs of the games the tests play to a temporary directory.
+    """
+    monkeypatch.setattr(main, 'GAME_LOG_DIR', str(tmp_path))
+
+
+def test_importing_main_starts_nothing(tmp_path):
+    """
+    Test if importing main starts no pools or threads and writes nothing, which waits for the first request.
+    """
+    code = 'import threading, main; print(main.AI_POOL, main.LAYOUT_POOL, threading.active_count())'
+    result = subprocess.run([sys.executable, '-c', code], cwd=tmp_path, capture_output=True, text=True,
+                            env=dict(os.environ, PYTHONPATH=os.path.dirname(os.path.abspath(main.__file__))))
+    assert result.stdout.split() == ['None', 'None', '1'], "importing main started background work"
+    assert not os.path.exists(tmp_path / 'game_logs'), "importing main created the log directory"
+    main.app.test_client().get('/joinmultiplayer')
+    assert main.AI_POOL is not None and main.LAYOUT_POOL is not None, "first request did not start the pools"
+
+
+def test_game_start_is_only_sent_to_its_room():
+    """
+    Test if the game_start event only reaches the sockets of the game that is starting.
+    """
+    waiting = main.socket.test_client(main.app, query_string='gamecode=room-test-1')
+    other = main.socket.test_client(main.app, query_string='gamecode=room-test-2')
+    http = main.app.test_client()
+    http.get('/create_game?gamecode=room-test-1&playerid=1')
+    http.get('/create_game?gamecode=room-test-1&playerid=2')
+    assert [event['name'] for event in waiting.get_received()] == ['game_start'], \
+        "the waiting player was not told the game started"
+    assert other.get_received() == [], "a socket of another game was sent the event"
+
+
+def test_missing_multiplayer_game_is_not_found():
+    """
+    Test if requests for a multiplayer game that has finished or been removed get a 404.
+    """
+    http = main.app.test_client()
+    response = http.post('/mpattack', json={'gamecode': 'missing-game', 'playerid': '1', 'x': 0, 'y': 0})
+    assert response.status_code == 404 and response.get_json() == {'error': 'game not found'}, \
+        "attack on a missing game was not a 404"
+    response = http.get('/mpplay?gamecode=missing-game&playerid=1')
+    assert response.status_code == 404, "page of a missing game was not a 404"
+
+
+def test_attack_event_is_sent_to_the_game_room():
+    """
+    Test if a round of attacks is sent to the game's room once both players have attacked.
+    """
+    client = main.socket.test_client(main.app, query_string='gamecode=room-test-3')
+    http = main.app.test_client()
+    ships = {name: [0, row, 'h'] for row, name in enumerate(main.create_battleships())}
+    for playerid in ('1', '2'):
+        http.get(f'/create_game?gamecode=room-test-3&playerid={playerid}')
+    for playerid in ('1', '2'):
+        http.post('/mpplacement', json=dict(ships, gamecode='room-test-3', playerid=playerid))
+    client.get_received()
+    for playerid in ('1', '2'):
+        http.post('/mpattack', json={'gamecode': 'room-test-3', 'playerid': playerid, 'x': 9, 'y': 9})
+    events = client.get_received()
+    assert [event['name'] for event in events] == ['attacksoc'], "the round was not sent to the room"
+    assert events[0]['args'][0]['1']['AI_Turn'] == [9, 9], "the event does not hold the other player's attack"
+
+
+class SlowPool:
+    """
+    Stands in for the AI pool, taking half a second to choose each move.
+    """
+
+    def next_move(self, ai, ships, key=None):
+        time.sleep(0.5)
+        return quick_move(ai, ships), ai
+
+    def speculate(self, key, ai, ships):
+        pass
+
+    def discard(self, key):
+        pass
+
+
+def test_requests_are_served_while_a_move_is_pending(monkeypatch):
+    """
+    Test if an unpatched gevent server, as python main.py runs, serves a second request while /attack waits on the AI.
+    """
+    gevent = pytest.importorskip('gevent')
+    from gevent import monkey, socket
+    from gevent.pywsgi import WSGIServer
+    if main.socket.async_mode != 'gevent' or monkey.is_module_patched('threading'):
+        pytest.skip('the server is not run from unpatched gevent')
+    main.start_background_work()
+    monkeypatch.setattr(main, 'AI_POOL', SlowPool())
+    server = WSGIServer(('127.0.0.1', 0), main.app, log=None)
+    server.start()
+
+    def get(path):
+        connection = socket.create_connection(('127.0.0.1', server.server_port))
+        connection.sendall(f'GET {path} HTTP/1.0\r\nHost: localhost\r\n\r\n'.encode())
+        while connection.recv(65536):
+            pass
+        connection.close()
+        return time.perf_counter()
+
+    try:
+        attack = gevent.spawn(get, '/attack?x=0&y=0')
+        gevent.sleep(0.1)
+        other = gevent.spawn(get, '/joinmultiplayer')
+        gevent.joinall([attack, other], timeout=10)
+    finally:
+        server.stop()
+    assert other.value < attack.value, "the second request waited for the AI's move"
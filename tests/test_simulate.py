@@ -0,0 +1,40 @@
+from simulate import NeatPlayer, game_seeds, load_neat_genome, play_game, simulate
+
+
+def test_simulation_is_reproducible_across_workers():
+    """
+    Test if a run gives the same shots to win for each game in one process and in a process pool.
+    """
+    fleet = {'ship1': 3, 'ship2': 2}
+    in_process = simulate('random', 6, size=5, fleet=fleet, seed=3, workers=1, chunksize=2)
+    pooled = simulate('random', 6, size=5, fleet=fleet, seed=3, workers=2, chunksize=2)
+    assert list(in_process.shots) == list(pooled.shots), "the pool changes the result of the games"
+    assert game_seeds(3, 6) == game_seeds(3, 6), "game seeds are not deterministic"
+    summary = in_process.summary()
+    assert summary['games'] == 6 and 5 <= summary['mean_shots'] <= 25, "summary of the games is wrong"
+    assert len(in_process.latencies) == sum(in_process.shots), "a move time is not kept for every shot"
+
+
+def test_ai_game_sinks_every_ship():
+    """
+    Test if a game of the AI ends with every ship sunk within the size of the board.
+    """
+    fleet = {'ship1': 3, 'ship2': 2}
+    shots, latencies = play_game('ai', 5, fleet, 7, {'time_allowed': 0.05, 'samples': 20})
+    assert 5 <= shots <= 25, "AI game did not sink every ship in a valid number of shots"
+    assert len(latencies) == shots, "a move time is not kept for every shot"
+
+
+def test_neat_player_never_repeats_a_shot():
+    """
+    Test if the NEAT player loads from the population file and only fires at new cells.
+    """
+    genome = load_neat_genome('population.pickle')
+    assert len(genome.node_genes) >= 200, "genome was not loaded with a node for each input and output"
+    player = NeatPlayer(10, {'ship1': 2}, 0, {})
+    shots = set()
+    for _ in range(100):
+        coord = player.next_move({'ship1': 2})
+        assert coord not in shots, "NEAT player fired at the same cell twice"
+        shots.add(coord)
+        player.register_shot(coord, False)
@@ -0,0 +1,112 @@
+import pickle
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import pytest
+
+from aiClass import mainAI, shared_move_cache
+from game_sessions import SinglePlayerGame
+from state_backend import MemoryBackend, SQLiteBackend, open_backend
+
+
+def add_moves(path, moves):
+    """
+    Adds moves to a shared game one update at a time, in a separate process.
+    """
+    games = SQLiteBackend(path, table='multiplayer')
+    for move in moves:
+        with games.update('1') as game:
+            game['moves'].append(move)
+
+
+def add_move(games, move):
+    """
+    Adds a move to a shared game, from a thread of this process.
+    """
+    with games.update('1') as game:
+        game['moves'].append(move)
+
+
+@pytest.mark.parametrize('backend', ['memory', 'sqlite'])
+def test_backend_updates_and_removes_games(tmp_path, backend):
+    """
+    Test if both backends save updates, remove finished and excess games, and count them.
+    """
+    url = 'memory' if backend == 'memory' else f'sqlite:///{tmp_path / "games.db"}'
+    games = open_backend(url, 'multiplayer', max_games=2)
+    with games.update('1', create=dict) as game:
+        game['joined'] = ['a']
+    with games.update('1', create=dict) as game:
+        game['joined'].append('b')
+    assert games.get('1') == {'joined': ['a', 'b']}, "update was not saved"
+    with pytest.raises(KeyError):
+        with games.update('missing'):
+            pass
+    games.put('2', {'joined': []})
+    games.put('3', {'joined': []})
+    assert '1' not in games and games.get('1') is None, "least recently used game was not evicted"
+    games.finish('2')
+    assert games.stats() == {'live': 1, 'evicted': 1, 'finished': 1}, "counters are wrong"
+
+
+def test_sqlite_backend_is_shared_between_processes(tmp_path):
+    """
+    Test if updates to one game from several processes are all kept.
+    """
+    path = str(tmp_path / 'games.db')
+    games = SQLiteBackend(path, table='multiplayer')
+    games.put('1', {'moves': []})
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        list(executor.map(add_moves, [path] * 4, [range(i * 10, i * 10 + 10) for i in range(4)]))
+    assert sorted(games.get('1')['moves']) == list(range(40)), "an update from another process was lost"
+
+
+def test_sqlite_backend_threads_share_one_connection(tmp_path):
+    """
+    Test if the threads of a process take turns on one connection without losing updates.
+    """
+    games = SQLiteBackend(str(tmp_path / 'games.db'), table='multiplayer')
+    games.put('1', {'moves': []})
+    connection = games.db
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(add_move, [games] * 40, range(40)))
+    assert sorted(games.get('1')['moves']) == list(range(40)), "an update from another thread was lost"
+    assert games.db is connection, "a thread opened its own connection"
+
+
+def test_sqlite_backend_reads_while_another_process_writes(tmp_path):
+    """
+    Test if a game can be read while another connection holds the write lock of the database.
+    """
+    path = str(tmp_path / 'games.db')
+    games = SQLiteBackend(path, table='multiplayer')
+    games.put('1', {'moves': [1]})
+    writer = sqlite3.connect(path, isolation_level=None)
+    writer.execute('BEGIN IMMEDIATE')
+    try:
+        start = time.perf_counter()
+        assert '1' in games and games.get('1') == {'moves': [1]}, "game was not read"
+        assert time.perf_counter() - start < 1, "a read waited for the write lock"
+    finally:
+        writer.execute('ROLLBACK')
+        writer.close()
+
+
+def test_single_player_game_round_trips():
+    """
+    Test if a single player game is the same after being pickled, and its AI keeps its density maps and uses the shared move cache.
+    """
+    game = SinglePlayerGame(10, mainAI(10, time_allowed=0.05, seed=1))
+    for _ in range(5):
+        move = game.AI.new_next_move(game.player_ships)
+        game.AI.register_shot(move, False)
+    loaded = pickle.loads(pickle.dumps(game))
+    assert loaded.AI_board == game.AI_board and loaded.AI.misses == game.AI.misses, "game was not restored"
+    assert loaded.AI.move_cache is shared_move_cache, "loaded AI does not use the shared move cache"
+    assert loaded.AI.search() == game.AI.search(), "loaded AI chooses a different move"
+    for length, density in game.AI.densities.items():
+        assert loaded.AI.densities[length].counts == density.counts, "density counts were not kept"
+        assert loaded.AI.densities[length].ruled_out_by is density.ruled_out_by, \
+            "loaded density map does not use the shared index"
+    assert isinstance(MemoryBackend().get('1', game), SinglePlayerGame), "default was not returned"